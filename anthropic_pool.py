@@ -0,0 +1,244 @@
+"""Пул ключей Anthropic API с выбором наименее загруженного ключа.
+
+Ключи задаются как ANTHROPIC_API_KEY_1..N (или один ANTHROPIC_API_KEY).
+После каждого ответа пул запоминает остаток лимитов ключа из заголовков
+anthropic-ratelimit-*, и очередной запрос уходит через ключ с наибольшим запасом
+запросов и токенов с учетом уже выполняющихся запросов. Ключ, получивший 429,
+отдыхает до retry-after, а остальные продолжают работать; запрос ждет только
+тогда, когда отдыхают все ключи.
+В рабочих процессах HTTP API время отдыха ключей общее (share_cooldowns):
+429 в одном процессе сразу убирает ключ из выбора и в остальных.
+"""
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import resources
+from deadline import Deadline
+
+# Виды лимитов из заголовков anthropic-ratelimit-<вид>-remaining/-limit/-reset
+LIMIT_KINDS = ("requests", "tokens", "input-tokens", "output-tokens")
+
+# Пауза для ключа после 429, если сервер не сообщил, когда повторять (секунды)
+DEFAULT_COOLDOWN = 30
+
+# Сколько запрос ждет освобождения ключа, если дедлайн не передан (секунды)
+DEFAULT_WAIT = 600
+
+
+# Функция для разбора времени сброса лимита (RFC 3339) в timestamp
+def _parse_reset(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+# Функция для грубой оценки числа токенов запроса (4 символа на токен)
+def estimate_tokens(*parts):
+    chars = 0
+    for part in parts:
+        if isinstance(part, str):
+            chars += len(part)
+        elif isinstance(part, list):
+            chars += sum(len(block.get("text", "")) for block in part if isinstance(block, dict))
+    return chars // 4
+
+
+class KeyState:
+    """Лимиты и текущая нагрузка одного ключа"""
+
+    def __init__(self, number, api_key):
+        self.number = number
+        self.api_key = api_key
+        self.key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        self.limits = {}  # вид лимита -> (осталось, лимит, время сброса)
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.reserved_tokens = 0
+        self.calls = 0
+        self.rate_limited = 0
+
+    def update(self, headers):
+        for kind in LIMIT_KINDS:
+            remaining = headers.get(f"anthropic-ratelimit-{kind}-remaining")
+            limit = headers.get(f"anthropic-ratelimit-{kind}-limit")
+            if remaining is None or limit is None:
+                continue
+            try:
+                self.limits[kind] = (
+                    int(remaining),
+                    int(limit),
+                    _parse_reset(headers.get(f"anthropic-ratelimit-{kind}-reset"))
+                )
+            except ValueError:
+                continue
+
+    def headroom(self, now):
+        """Доля оставшегося лимита (0..1) за вычетом выполняющихся запросов"""
+        ratios = []
+        for kind, (remaining, limit, reset_at) in self.limits.items():
+            if not limit or (reset_at is not None and reset_at <= now):
+                continue  # Окно лимита уже обновилось
+            pending = self.in_flight if kind == "requests" else self.reserved_tokens
+            ratios.append(max(0, remaining - pending) / limit)
+        return min(ratios) if ratios else 1.0
+
+
+class Lease:
+    """Ключ, выданный пулом на один запрос"""
+
+    def __init__(self, pool, key):
+        self.pool = pool
+        self.key = key
+        self.client = resources.get_anthropic_client(key.api_key)
+
+    def update(self, headers):
+        """Запоминает лимиты ключа из заголовков ответа"""
+        with self.pool._lock:
+            self.key.update(headers)
+
+
+# Общий для процессов словарь {key_id: отдых до} (multiprocessing.Manager().dict()) или None
+_shared_cooldowns = None
+
+
+# Функция для подключения общего времени отдыха ключей (вызывается в рабочем процессе HTTP API)
+def share_cooldowns(cooldowns):
+    global _shared_cooldowns
+    _shared_cooldowns = cooldowns
+
+
+def _read_shared_cooldowns():
+    if _shared_cooldowns is None:
+        return {}
+    try:
+        return dict(_shared_cooldowns.items())
+    except Exception:
+        return {}  # Сервер остановлен - работаем с локальным состоянием
+
+
+def _publish_cooldown(key_id, until):
+    if _shared_cooldowns is None:
+        return
+    try:
+        _shared_cooldowns[key_id] = max(until, _shared_cooldowns.get(key_id, 0.0))
+    except Exception:
+        pass
+
+
+class AnthropicPool:
+    def __init__(self, api_keys):
+        self.api_keys = list(api_keys)
+        self.keys = [KeyState(i + 1, api_key) for i, api_key in enumerate(self.api_keys)]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _sync_cooldowns(self):
+        """Учитывает отдых ключей, назначенный в других процессах"""
+        shared = _read_shared_cooldowns()
+        if not shared:
+            return
+        with self._lock:
+            for key in self.keys:
+                key.cooldown_until = max(key.cooldown_until, shared.get(key.key_id, 0.0))
+
+    def has_headroom(self):
+        """Есть ли ключ, который сейчас не отдыхает после 429"""
+        self._sync_cooldowns()
+        now = time.time()
+        return any(key.cooldown_until <= now for key in self.keys)
+
+    def _pick(self, now):
+        available = [key for key in self.keys if key.cooldown_until <= now]
+        if not available:
+            return None
+        # Больше запас лимита -> меньше запросов в работе -> реже использовался
+        return max(available, key=lambda key: (key.headroom(now), -key.in_flight, -key.calls))
+
+    def _cool_down(self, key, headers):
+        retry_after = None
+        try:
+            retry_after = float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+        with self._lock:
+            key.update(headers)
+            key.rate_limited += 1
+            if retry_after is None:
+                resets = [reset_at for remaining, _, reset_at in key.limits.values() if remaining <= 0 and reset_at]
+                retry_after = max(resets) - time.time() if resets else DEFAULT_COOLDOWN
+            key.cooldown_until = max(key.cooldown_until, time.time() + max(retry_after, 1))
+        _publish_cooldown(key.key_id, key.cooldown_until)
+
+    @contextmanager
+    def lease(self, deadline=None, tokens=0):
+        """Выдает наименее загруженный ключ на время запроса.
+
+        Если все ключи отдыхают после 429, ждет ближайший в пределах дедлайна.
+        RateLimitError внутри блока отправляет ключ отдыхать и пробрасывается дальше.
+        """
+        import anthropic
+
+        deadline = deadline or Deadline(DEFAULT_WAIT)
+        while True:
+            self._sync_cooldowns()
+            with self._lock:
+                now = time.time()
+                key = self._pick(now)
+                if key is not None:
+                    key.in_flight += 1
+                    key.reserved_tokens += tokens
+                    key.calls += 1
+                    break
+                wait_time = min(key.cooldown_until for key in self.keys) - now
+            deadline.sleep(max(wait_time, 0.1), what="ожидание свободного ключа Anthropic")
+
+        try:
+            yield Lease(self, key)
+        except anthropic.RateLimitError as e:
+            self._cool_down(key, e.response.headers)
+            raise
+        finally:
+            with self._lock:
+                key.in_flight -= 1
+                key.reserved_tokens -= tokens
+
+    def snapshot(self):
+        """Состояние ключей для отображения: номер, запас, запросы, отдых"""
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "key": key.number,
+                    "headroom": round(key.headroom(now), 2),
+                    "in_flight": key.in_flight,
+                    "calls": key.calls,
+                    "rate_limited": key.rate_limited,
+                    "cooldown": max(0, round(key.cooldown_until - now)),
+                }
+                for key in self.keys
+            ]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Функция для получения пула ключей (None, если ключи не заданы)
+def get_pool():
+    global _pool
+    api_keys = resources.get_anthropic_api_keys()
+    if not api_keys:
+        return None
+    if _pool is None or _pool.api_keys != api_keys:
+        with _pool_lock:
+            if _pool is None or _pool.api_keys != api_keys:
+                _pool = AnthropicPool(api_keys)
+    return _pool
@@ -0,0 +1,100 @@
+"""Клиент HTTP API задач (api_server.py).
+
+Если задан TOPIC_MAKER_API_URL, страница Streamlit не выполняет задачи сама:
+она ставит задачу в API, опрашивает ее статус и показывает события.
+Кнопка отмены и дедлайн операции передаются в API - задача останавливается
+в рабочем процессе.
+"""
+import time
+
+import resources
+from deadline import Cancelled, DeadlineExceeded
+
+# Интервал опроса статуса задачи (секунды)
+POLL_INTERVAL = 0.5
+
+# Сколько ждать итогового статуса от сервера после дедлайна (секунды)
+DEADLINE_GRACE = 15
+
+
+class RemoteJobError(Exception):
+    """Задача в HTTP API завершилась ошибкой; error_type - имя исходного исключения"""
+
+    def __init__(self, message, error_type="Exception"):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+def get_api_url():
+    return (resources.get_secret("TOPIC_MAKER_API_URL") or "").rstrip("/")
+
+
+def is_enabled():
+    return bool(get_api_url())
+
+
+# Функция для запроса к HTTP API
+def _request(method, path, **kwargs):
+    headers = {}
+    token = resources.get_secret("TOPIC_MAKER_API_TOKEN")
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    response = resources.get_http_session().request(
+        method,
+        get_api_url() + path,
+        headers=headers,
+        timeout=resources.HTTP_TIMEOUT,
+        **kwargs
+    )
+    if response.status_code >= 400:
+        raise RemoteJobError(f"HTTP API {response.status_code}: {response.text[:200]}", "HTTPError")
+    return response.json()
+
+
+# Функция для отмены задачи
+def cancel(job_id):
+    try:
+        _request("DELETE", f"/jobs/{job_id}")
+    except Exception:
+        pass  # Задача все равно остановится по дедлайну
+
+
+# Функция для преобразования ошибки задачи в исключение
+def _job_error(job):
+    error_type = job.get("error_type") or "Exception"
+    message = job.get("error") or "Задача завершилась ошибкой"
+    if job["status"] == "cancelled" or error_type == "Cancelled":
+        return Cancelled(message)
+    if error_type == "DeadlineExceeded":
+        return DeadlineExceeded(message)
+    return RemoteJobError(message, error_type)
+
+
+# Функция для выполнения задачи в HTTP API с ожиданием результата
+def run(kind, params, deadline, on_event=None):
+    """Возвращает результат задачи; on_event(event) вызывается для каждого события"""
+    deadline.check(f"задача {kind}")
+    job = _request("POST", f"/{kind}", json={"params": params, "timeout": deadline.remaining()})
+    job_id = job["id"]
+    remove_callback = deadline.on_cancel(lambda: cancel(job_id))
+    seq = 0
+    try:
+        while True:
+            job = _request("GET", f"/jobs/{job_id}", params={"since": seq})
+            for event in job.get("events", []):
+                seq = event["seq"]
+                if on_event is not None:
+                    on_event(event)
+
+            if job["status"] == "done":
+                return job["result"]
+            if job["status"] in ("failed", "cancelled"):
+                raise _job_error(job)
+            if deadline.cancelled:
+                raise Cancelled("Операция отменена пользователем")
+            if time.time() > deadline.expires_at + DEADLINE_GRACE:
+                cancel(job_id)
+                raise DeadlineExceeded(f"Истек лимит времени {deadline.seconds:.0f} с (задача {kind})")
+            time.sleep(POLL_INTERVAL)
+    finally:
+        remove_callback()
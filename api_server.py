@@ -0,0 +1,396 @@
+"""HTTP API задач пайплайна с пулом рабочих процессов.
+
+Задачи (jobs.py) выполняются в отдельных процессах, поэтому долгая генерация
+не занимает процесс Streamlit и не мешает другим пользователям. Задачи в основном
+ждут ответов Claude и YouTube, поэтому каждый процесс выполняет несколько задач
+в потоках: одновременно работает до workers * threads задач.
+
+Использование:
+    python api_server.py [--host 127.0.0.1] [--port 8600] [--workers N] [--threads M]
+
+Эндпоинты:
+    POST /reference | /synopsis | /artifact | /ingest | /replies
+        тело {"params": {...}, "timeout": секунды} -> 202 {"id": ..., "status": "queued"}
+    GET /jobs/<id>?since=<seq> - статус, результат и события с номером больше seq
+    DELETE /jobs/<id> - отмена задачи
+    GET /health - число рабочих процессов, задач на процесс и задач по статусам
+    GET /export/<video_id>?format=srt|vtt|jsonl - транскрипция из хранилища
+    GET /export?format=jsonl|srt|vtt[&ids=id1,id2] - все видео хранилища
+        (jsonl - один файл, srt/vtt - zip-архив); ответы отдаются потоком
+
+Переменные окружения:
+    API_HOST, API_PORT, API_WORKERS (по умолчанию - число ядер),
+    API_WORKER_THREADS (задач на процесс, по умолчанию 8),
+    TOPIC_MAKER_API_TOKEN - если задан, запросы должны содержать Authorization: Bearer <token>
+"""
+import os
+import json
+import time
+import uuid
+import argparse
+import collections
+import threading
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import resources
+import jobs
+import export
+from generation import DEFAULT_DEADLINE
+
+# Сколько хранить завершенные задачи и сколько последних событий задачи (секунды / штуки)
+JOB_TTL = 3600
+MAX_EVENTS = 500
+
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+
+class JobManager:
+    """Очередь задач на рабочих процессах: статусы, события и отмена.
+
+    Сервер сам раздает задачи процессам - каждому через его собственную очередь и
+    не больше threads задач на процесс, поэтому знает, какие задачи выполняет
+    каждый процесс. Если процесс аварийно завершился (нехватка памяти, сбой),
+    его задачи помечаются ошибкой, а вместо него запускается новый.
+    """
+
+    def __init__(self, workers, threads):
+        # spawn: рабочие процессы не наследуют потоки и блокировки сервера
+        self._context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.threads = threads
+        self._manager = self._context.Manager()
+        self._events = self._manager.Queue()
+        # Время отдыха ключей Anthropic после 429 - общее для всех рабочих процессов
+        self._cooldowns = self._manager.dict()
+        self._jobs = {}
+        self._tasks = {}
+        self._pending = collections.deque()
+        self._cancel_events = {}
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._workers = [self._start_worker() for _ in range(workers)]
+        threading.Thread(target=self._drain_events, name="job-events", daemon=True).start()
+        threading.Thread(target=self._supervise, name="job-workers", daemon=True).start()
+
+    def _start_worker(self):
+        tasks = self._context.Queue()
+        process = self._context.Process(
+            target=jobs.worker_loop,
+            args=(tasks, self._events, self.threads, self._cooldowns),
+            daemon=True
+        )
+        process.start()
+        return {"process": process, "tasks": tasks, "running": set()}
+
+    def submit(self, kind, params, timeout):
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+            "result": None,
+            "error": None,
+            "error_type": None,
+            "pid": None,
+            "events": [],
+            "seq": 0,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            cancel_event = self._manager.Event()
+            with self._lock:
+                self._cancel_events[job_id] = cancel_event
+                self._tasks[job_id] = (job_id, kind, params, time.time() + timeout, cancel_event)
+                self._pending.append(job_id)
+                self._dispatch()
+        except Exception as e:
+            with self._lock:
+                self._tasks.pop(job_id, None)
+                self._finish(job_id, {"ok": False, "error_type": type(e).__name__, "error": f"Не удалось поставить задачу: {e}"})
+        return self.get(job_id)
+
+    def _dispatch(self):
+        # Вызывается под self._lock: задачи из очереди - наименее загруженным процессам
+        while self._pending:
+            worker = min(self._workers, key=lambda worker: len(worker["running"]))
+            if len(worker["running"]) >= self.threads or not worker["process"].is_alive():
+                return
+            job_id = self._pending.popleft()
+            task = self._tasks.pop(job_id, None)
+            job = self._jobs.get(job_id)
+            if task is None or job is None or job["status"] in FINISHED_STATUSES:
+                continue  # Отменена, пока ждала в очереди
+            worker["tasks"].put(task)
+            worker["running"].add(job_id)
+            job["pid"] = worker["process"].pid
+
+    def _finish(self, job_id, outcome):
+        # Вызывается под self._lock
+        for worker in self._workers:
+            worker["running"].discard(job_id)
+        job = self._jobs.get(job_id)
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return  # Например, задача отменена до запуска
+        job["finished"] = time.time()
+        if outcome["ok"]:
+            job["status"] = "done"
+            job["result"] = outcome["result"]
+        else:
+            job["status"] = "cancelled" if outcome["error_type"] == "Cancelled" else "failed"
+            job["error"] = outcome["error"]
+            job["error_type"] = outcome["error_type"]
+
+    def _supervise(self):
+        while not self._stopping:
+            time.sleep(1)
+            with self._lock:
+                if self._stopping:
+                    return
+                for i, worker in enumerate(self._workers):
+                    process = worker["process"]
+                    if process.is_alive():
+                        continue
+                    print(f"Рабочий процесс {process.pid} завершился с кодом {process.exitcode}, запускаю новый")
+                    for job_id in list(worker["running"]):
+                        self._finish(job_id, {
+                            "ok": False,
+                            "error_type": "WorkerCrashed",
+                            "error": f"Рабочий процесс аварийно завершился (код {process.exitcode})",
+                        })
+                    worker["tasks"].close()
+                    try:
+                        self._workers[i] = self._start_worker()
+                    except Exception as e:
+                        print(f"Не удалось запустить рабочий процесс: {e}")
+                self._dispatch()
+
+    def _drain_events(self):
+        while True:
+            try:
+                job_id, event = self._events.get()
+            except (EOFError, OSError):
+                return  # Менеджер остановлен
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if event.get("type") == "finished":
+                    self._finish(job_id, event["outcome"])
+                    self._dispatch()
+                    continue
+                if event.get("type") == "started" and job["status"] == "queued":
+                    job["status"] = "running"
+                    job["started"] = time.time()
+                job["seq"] += 1
+                job["events"].append(dict(event, seq=job["seq"]))
+                del job["events"][:-MAX_EVENTS]
+
+    def get(self, job_id, since=0):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            public = {key: value for key, value in job.items() if key != "events"}
+            public["events"] = [event for event in job["events"] if event["seq"] > since]
+            return public
+
+    def cancel(self, job_id):
+        with self._lock:
+            cancel_event = self._cancel_events.get(job_id)
+        if cancel_event is None:
+            return None
+        cancel_event.set()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] == "queued":
+                # Задача еще не начата: из очереди сервера она не уйдет, а в процессе сразу вернет Cancelled
+                self._finish(job_id, {"ok": False, "error_type": "Cancelled", "error": "Задача отменена до запуска"})
+        return self.get(job_id)
+
+    def _prune(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in FINISHED_STATUSES and job["finished"] and now - job["finished"] > JOB_TTL
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+                self._cancel_events.pop(job_id, None)
+                self._tasks.pop(job_id, None)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            alive = sum(worker["process"].is_alive() for worker in self._workers)
+        return {"workers": self.workers, "alive_workers": alive, "threads": self.threads, "jobs": counts}
+
+    def shutdown(self):
+        with self._lock:
+            self._stopping = True
+            workers = list(self._workers)
+        for worker in workers:
+            worker["tasks"].put(None)
+        for worker in workers:
+            worker["process"].join(timeout=5)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+        self._manager.shutdown()
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    manager = None
+    token = None
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        if not self.token:
+            return True
+        if self.headers.get("Authorization") == f"Bearer {self.token}":
+            return True
+        self._send(401, {"error": "Неверный токен"})
+        return False
+
+    def _job_id(self, path):
+        parts = path.strip("/").split("/")
+        return parts[1] if len(parts) == 2 and parts[0] == "jobs" else None
+
+    def _start_stream(self, mime, filename):
+        # Без Content-Length: конец ответа - закрытие соединения
+        self.send_response(200)
+        self.send_header("Content-Type", mime)
+        self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _export(self, url):
+        query = parse_qs(url.query)
+        fmt = query.get("format", ["srt"])[0]
+        parts = url.path.strip("/").split("/")
+        if fmt not in export.FORMATS or len(parts) > 2:
+            self._send(400, {"error": f"Формат экспорта: {', '.join(export.FORMATS)}"})
+            return
+        try:
+            if len(parts) == 2:
+                try:
+                    meta, chunks = export.open_video(parts[1], fmt)
+                except (FileNotFoundError, ValueError):
+                    self._send(404, {"error": "Видео не найдено в хранилище"})
+                    return
+                self._start_stream(export.FORMATS[fmt]["mime"], f"{parts[1]}.{export.FORMATS[fmt]['extension']}")
+                for chunk in chunks:
+                    self.wfile.write(chunk)
+            else:
+                ids = query.get("ids", [""])[0]
+                video_ids = [video_id for video_id in ids.split(",") if video_id] or None
+                if fmt == "jsonl":
+                    self._start_stream(export.FORMATS[fmt]["mime"], "transcripts.jsonl")
+                else:
+                    self._start_stream("application/zip", f"transcripts_{fmt}.zip")
+                export.write_bulk(self.wfile, fmt, video_ids)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Клиент закрыл соединение
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send(200, self.manager.stats())
+            return
+        if not self._authorized():
+            return
+        if url.path.strip("/").split("/")[0] == "export":
+            self._export(url)
+            return
+        job_id = self._job_id(url.path)
+        if job_id is None:
+            self._send(404, {"error": "Не найдено"})
+            return
+        try:
+            since = int(parse_qs(url.query).get("since", ["0"])[0])
+        except ValueError:
+            since = 0
+        job = self.manager.get(job_id, since)
+        if job is None:
+            self._send(404, {"error": "Задача не найдена"})
+        else:
+            self._send(200, job)
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        kind = urlparse(self.path).path.strip("/")
+        if kind not in jobs.JOBS:
+            self._send(404, {"error": f"Неизвестная задача: {kind}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            params = body.get("params", {})
+            timeout = float(body.get("timeout") or DEFAULT_DEADLINE)
+        except (ValueError, AttributeError):
+            self._send(400, {"error": "Ожидается JSON {\"params\": {...}, \"timeout\": секунды}"})
+            return
+        job = self.manager.submit(kind, params, timeout)
+        self._send(503 if job["status"] == "failed" else 202, job)
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        job_id = self._job_id(urlparse(self.path).path)
+        job = self.manager.cancel(job_id) if job_id else None
+        if job is None:
+            self._send(404, {"error": "Задача не найдена"})
+        else:
+            self._send(200, job)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Функция для запуска HTTP API (блокирует до остановки)
+def serve(host, port, workers, threads):
+    manager = JobManager(workers, threads)
+    _ApiHandler.manager = manager
+    _ApiHandler.token = resources.get_secret("TOPIC_MAKER_API_TOKEN")
+    server = ThreadingHTTPServer((host, port), _ApiHandler)
+    print(f"HTTP API задач: http://{host}:{port}, рабочих процессов: {workers}, задач на процесс: {threads}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        manager.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API задач Topic Maker")
+    parser.add_argument("--host", default=os.environ.get("API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("API_PORT", "8600")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("API_WORKERS", os.cpu_count() or 2)))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("API_WORKER_THREADS", "8")))
+    args = parser.parse_args()
+
+    os.chdir(resources.APP_DIR)
+    serve(args.host, args.port, args.workers, args.threads)
+
+
+if __name__ == "__main__":
+    main()
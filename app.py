@@ -1,15 +1,20 @@
 import streamlit as st
 import re
 import os
-import io
-import base64
 import time
-from PIL import Image
-import requests
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-import anthropic
+import queue
+from concurrent.futures import wait, FIRST_COMPLETED
+import resources
+import anthropic_pool
+import generation
+import comments
+import ingest
+import jobs
+import api_client
+import search_index
+import store
+import export
+from deadline import Deadline, DeadlineExceeded
 
 # Настройка страницы
 st.set_page_config(
@@ -19,6 +24,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Прогрев клиентов и промптов в фоне (при запуске через serve.py уже идёт)
+resources.start_warmup()
+
 # Инициализация session_state
 if 'video_id' not in st.session_state:
     st.session_state.video_id = None
@@ -40,6 +48,29 @@ if 'synopsis_red' not in st.session_state:
     st.session_state.synopsis_red = ""
 if 'need_rerun' not in st.session_state:
     st.session_state.need_rerun = False
+for field in ['annotation_orig', 'annotation_red', 'scenario', 'thumbnail_texts', 'summary', 'video_comment']:
+    if field not in st.session_state:
+        st.session_state[field] = ""
+if 'prompt_language' not in st.session_state:
+    st.session_state.prompt_language = "en"
+if 'pending_artifacts' not in st.session_state:
+    st.session_state.pending_artifacts = []
+if 'run_timeout_min' not in st.session_state:
+    st.session_state.run_timeout_min = generation.DEFAULT_DEADLINE // 60
+if 'active_deadline' not in st.session_state:
+    st.session_state.active_deadline = None
+if 'run_cancelled' not in st.session_state:
+    st.session_state.run_cancelled = False
+if 'background_job' not in st.session_state:
+    st.session_state.background_job = None
+if 'reuse_threshold' not in st.session_state:
+    st.session_state.reuse_threshold = 90
+if 'synopsis_reused_from' not in st.session_state:
+    st.session_state.synopsis_reused_from = None
+if 'skip_synopsis_reuse' not in st.session_state:
+    st.session_state.skip_synopsis_reuse = False
+if 'transcript_export' not in st.session_state:
+    st.session_state.transcript_export = None
 
 # Функция для извлечения ID видео из URL YouTube
 def extract_video_id(url):
@@ -59,221 +90,6 @@ def extract_video_id(url):
         return match.group(1)
     return None
 
-# Функция для получения заголовка видео
-def get_video_title(video_id):
-    api_keys = []
-    # Получение API ключей из секретов
-    i = 1
-    while True:
-        key_name = f"YOUTUBE_API_KEY_{i}"
-        try:
-            if key_name in st.secrets:
-                api_keys.append(st.secrets[key_name])
-                i += 1
-            else:
-                break
-        except:
-            break
-    
-    if not api_keys:
-        return f"Видео ID: {video_id}"
-    
-    # Пробуем каждый ключ по очереди
-    for api_key in api_keys:
-        try:
-            youtube = build('youtube', 'v3', developerKey=api_key)
-            request = youtube.videos().list(
-                part="snippet",
-                id=video_id
-            )
-            response = request.execute()
-            
-            if response['items']:
-                return response['items'][0]['snippet']['title']
-            else:
-                return "Видео не найдено"
-        except HttpError as e:
-            if "quota" in str(e).lower():
-                continue  # Пробуем следующий ключ, если превышена квота
-            else:
-                return f"Ошибка: {str(e)[:100]}"
-    
-    return "Все API ключи исчерпали квоту"
-
-# Функция для получения транскрипции видео
-def get_video_transcript(video_id):
-    try:
-        # Создаем экземпляр API
-        api = YouTubeTranscriptApi()
-        
-        # Пробуем получить транскрипцию на разных языках
-        transcript_data = None
-        
-        # Список языков для попытки
-        languages_to_try = [
-            None,  # Сначала пробуем без указания языка (берет первую доступную)
-            ['en'],  # Английский
-            ['es'],  # Испанский  
-            ['ru'],  # Русский
-            ['fr'],  # Французский
-            ['de'],  # Немецкий
-            ['pt'],  # Португальский
-            ['it'],  # Итальянский
-            ['ja'],  # Японский
-            ['ko'],  # Корейский
-            ['zh'],  # Китайский
-        ]
-        
-        # Пробуем получить транскрипцию для каждого языка
-        for lang in languages_to_try:
-            try:
-                if lang is None:
-                    # Пробуем без указания языка - должно взять любую доступную
-                    transcript_data = api.fetch(video_id)
-                else:
-                    # Пробуем с конкретным языком
-                    transcript_data = api.fetch(video_id, languages=lang)
-                
-                if transcript_data:
-                    break  # Если успешно получили, выходим из цикла
-            except:
-                continue  # Если не получилось, пробуем следующий язык
-        
-        # Если ничего не получилось через api.fetch, пробуем альтернативный способ
-        if not transcript_data:
-            try:
-                # Получаем список всех доступных транскрипций и берем первую
-                from youtube_transcript_api._api import TranscriptListFetcher
-                fetcher = TranscriptListFetcher(video_id)
-                transcript_list = fetcher.fetch()
-                if transcript_list:
-                    # Берем первую доступную транскрипцию
-                    first_transcript = list(transcript_list.values())[0]
-                    if first_transcript:
-                        # Извлекаем язык из первой транскрипции
-                        lang_code = first_transcript.get('language', 'en')
-                        transcript_data = api.fetch(video_id, languages=[lang_code])
-            except:
-                pass
-        
-        # Собираем текст транскрипции в двух форматах
-        if transcript_data:
-            # transcript_data - это объект FetchedTranscript, который можно итерировать
-            # Каждый элемент имеет атрибуты: text, start, duration
-            
-            # Версия без временных меток
-            full_text = '\n'.join([str(entry.text) for entry in transcript_data])
-            
-            # Версия с временными метками
-            def format_time(seconds):
-                """Форматирует время в формат MM:SS или HH:MM:SS"""
-                hours = int(seconds // 3600)
-                minutes = int((seconds % 3600) // 60)
-                secs = int(seconds % 60)
-                if hours > 0:
-                    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
-                else:
-                    return f"{minutes:02d}:{secs:02d}"
-            
-            text_with_timestamps = []
-            for entry in transcript_data:
-                start_time = entry.start
-                text = str(entry.text)
-                text_with_timestamps.append(f"[{format_time(start_time)}] {text}")
-            
-            full_text_with_timestamps = '\n'.join(text_with_timestamps)
-            
-            return full_text, full_text_with_timestamps
-        else:
-            return "Транскрипция недоступна для этого видео", "Транскрипция недоступна для этого видео"
-            
-    except Exception as e:
-        # Обработка различных типов ошибок
-        error_str = str(e)
-        if "no element found" in error_str.lower() or "xml" in error_str.lower():
-            return "Транскрипция недоступна для этого видео", "Транскрипция недоступна для этого видео"
-        else:
-            error_msg = f"Не удалось получить транскрипцию: {error_str[:200]}"
-            return error_msg, error_msg
-
-# Функция для получения текста с превью через Claude API
-def get_thumbnail_text(video_id):
-    try:
-        # Получаем URL превью
-        thumbnail_url = f"https://i.ytimg.com/vi/{video_id}/maxresdefault.jpg"
-        response = requests.get(thumbnail_url)
-        
-        # Если maxresdefault не доступен, пробуем hqdefault
-        if response.status_code != 200:
-            thumbnail_url = f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
-            response = requests.get(thumbnail_url)
-            
-        if response.status_code != 200:
-            return "Не удалось получить превью видео"
-        
-        # Открываем изображение
-        image = Image.open(io.BytesIO(response.content))
-        
-        # Конвертируем изображение в base64
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode()
-        
-        # Загружаем промпт для обработки изображения
-        try:
-            with open("prompt_get_thumbnail_text.txt", "r", encoding="utf-8") as file:
-                prompt_text = file.read()
-        except FileNotFoundError:
-            prompt_text = "Опишите текст, который вы видите на этом изображении превью YouTube видео. Выпишите весь текст точно как он написан."
-        
-        # Инициализируем клиент Claude
-        if "ANTHROPIC_API_KEY" not in st.secrets:
-            # Отладочная информация о доступных секретах
-            available_keys = list(st.secrets.keys()) if hasattr(st.secrets, 'keys') else []
-            return f"API ключ Anthropic не найден. Доступные ключи: {available_keys}"
-        
-        # Получаем ключ и проверяем его формат
-        api_key = str(st.secrets["ANTHROPIC_API_KEY"])
-        if not api_key or not api_key.startswith("sk-"):
-            return f"Неверный формат API ключа Anthropic (должен начинаться с 'sk-')"
-        
-        # Создаем клиент только с API ключом, избегая дополнительных параметров от Streamlit
-        import anthropic as anthropic_module
-        client = anthropic_module.Anthropic(api_key=api_key)
-        
-        # Отправляем запрос к Claude
-        message = client.messages.create(
-            model="claude-3-haiku-20240307",  # Используем Haiku для обработки изображений
-            max_tokens=1000,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt_text
-                        },
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": img_base64
-                            }
-                        }
-                    ]
-                }
-            ]
-        )
-        
-        return message.content[0].text
-    except Exception as e:
-        # Более подробная информация об ошибке
-        error_msg = f"Ошибка при обработке превью: {str(e)}"
-        if "api_key" in str(e).lower():
-            error_msg = "Проблема с API ключом Anthropic. Проверьте правильность ключа в секретах."
-        return error_msg
-
 # Функция для выбора модели Claude
 def get_claude_model():
     model_mapping = {
@@ -296,91 +112,70 @@ def get_max_tokens():
     else:  # Claude Sonnet 4.1
         return 4096
 
+# Функция для получения имени типа ошибки (для задач из HTTP API - имя исходного исключения)
+def error_type(e):
+    return getattr(e, "error_type", type(e).__name__)
+
+# Функция для создания синопсиса через задачу "synopsis" с дедлайном и сообщениями о повторах
+def run_synopsis(kind, content, too_large_error):
+    """Возвращает (результат задачи, ошибка). Вызывается из основного потока скрипта"""
+    try:
+        result = run_job("synopsis", {
+            "kind": kind,
+            "content": content,
+            "model": get_claude_model(),  # Используем модель, выбранную пользователем
+            "max_tokens": get_max_tokens(),  # Используем правильный лимит для модели
+            "video_id": st.session_state.video_id,
+            "title": st.session_state.video_title,
+            "reuse": not st.session_state.skip_synopsis_reuse,
+            "reuse_threshold": st.session_state.reuse_threshold / 100,
+        })
+        print(f"DEBUG: Получен синопсис длиной {len(result['synopsis'])} символов")
+        return result, None
+    except DeadlineExceeded as e:
+        return None, f"⏱️ {e}"
+    except Exception as e:
+        error_str = str(e)
+        if error_type(e) == "RateLimitError":
+            if "input tokens" in error_str.lower():
+                return None, too_large_error
+            return None, "Превышен лимит запросов API. Пожалуйста, подождите 5-10 минут и попробуйте снова."
+        if error_type(e) == "APITimeoutError":
+            return None, "Превышено время ожидания ответа. Попробуйте еще раз."
+        if error_type(e) == "FileNotFoundError":
+            return None, f"Не найден файл промпта: {error_str[:200]}"
+        if "rate_limit" in error_str.lower() or "429" in error_str:
+            return None, "Превышен лимит запросов. Подождите 5-10 минут перед следующей попыткой."
+        return None, f"Ошибка: {error_str[:200]}"
+
+# Функция-обработчик отказа от найденного в индексе синопсиса
+def reject_reused_synopsis():
+    st.session_state.synopsis_orig = ""
+    st.session_state.synopsis_red = ""
+    st.session_state.synopsis_reused_from = None
+    st.session_state.skip_synopsis_reuse = True
+
 # Функция для создания синопсиса референса
 def create_synopsis_orig():
-    """Создает синопсис на основе транскрипции видео"""
+    """Создает синопсис на основе транскрипции видео.
+
+    Если похожая транскрипция уже обработана, синопсис берется из индекса без запроса к Claude.
+    """
     try:
         # Проверяем наличие транскрипции
         transcript = st.session_state.get('transcript', '')
         if not transcript:
             return None, "Нет транскрипции для создания синопсиса"
         
-        # Загружаем промпт
-        try:
-            with open("prompt_synopsis_orig.txt", "r", encoding="utf-8") as file:
-                prompt_text = file.read()
-        except FileNotFoundError:
-            return None, "Не найден файл prompt_synopsis_orig.txt"
-        
-        # Проверяем наличие API ключа
-        if "ANTHROPIC_API_KEY" not in st.secrets:
-            return None, "API ключ Anthropic не найден в секретах"
-        
-        # Инициализируем клиент Claude
-        api_key = str(st.secrets["ANTHROPIC_API_KEY"])
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        # Попытки отправки запроса с обработкой rate limit
-        max_retries = 5  # Увеличиваем количество попыток
-        base_delay = 10  # Начинаем с меньшей задержки
-        
-        for attempt in range(max_retries):
-            try:
-                # Используем экспоненциальную задержку между попытками
-                if attempt > 0:
-                    wait_time = base_delay * (2 ** (attempt - 1))  # 10, 20, 40, 80 секунд
-                    st.info(f"⏳ Попытка {attempt + 1}/{max_retries}. Ожидание {wait_time} секунд...")
-                    time.sleep(wait_time)
-                
-                # Отправляем запрос к Claude с правильным лимитом токенов
-                message = client.messages.create(
-                    model=get_claude_model(),  # Используем модель, выбранную пользователем
-                    max_tokens=get_max_tokens(),  # Используем правильный лимит для модели
-                    temperature=0.7,  # Добавляем температуру для более стабильных результатов
-                    system=prompt_text,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": transcript
-                        }
-                    ]
-                )
-                
-                result = message.content[0].text
-                print(f"DEBUG: Получен синопсис длиной {len(result)} символов")
-                return result, None
-                
-            except anthropic.RateLimitError as e:
-                error_details = str(e)
-                if "input tokens" in error_details.lower():
-                    # Специфичная ошибка превышения входных токенов
-                    if attempt < max_retries - 1:
-                        st.warning(f"⚠️ Превышен лимит входных токенов. Попытка {attempt + 2}/{max_retries} через некоторое время...")
-                        continue
-                    else:
-                        return None, "Текст слишком большой. Попробуйте использовать видео с меньшей транскрипцией или подождите несколько минут."
-                else:
-                    if attempt < max_retries - 1:
-                        continue
-                    else:
-                        return None, "Превышен лимит запросов API. Пожалуйста, подождите 5-10 минут и попробуйте снова."
-                        
-            except Exception as e:
-                error_str = str(e)
-                if "rate_limit" in error_str.lower() or "429" in error_str:
-                    if attempt < max_retries - 1:
-                        continue
-                    else:
-                        return None, "Превышен лимит запросов. Подождите 5-10 минут перед следующей попыткой."
-                elif "timeout" in error_str.lower():
-                    if attempt < max_retries - 1:
-                        st.warning("⏱️ Таймаут запроса. Повторная попытка...")
-                        continue
-                    else:
-                        return None, "Превышено время ожидания ответа. Попробуйте еще раз."
-                else:
-                    return None, f"Ошибка: {error_str[:200]}"
-                    
+        result, error = run_synopsis(
+            "orig",
+            transcript,
+            "Текст слишком большой. Попробуйте использовать видео с меньшей транскрипцией или подождите несколько минут."
+        )
+        if error:
+            return None, error
+        st.session_state.synopsis_reused_from = result["reused_from"]
+        return result["synopsis"], None
     except Exception as e:
         return None, f"Ошибка при создании синопсиса: {str(e)}"
 
@@ -392,84 +187,355 @@ def create_synopsis_red(synopsis_orig):
         if not synopsis_orig:
             return None, "Нет оригинального синопсиса для изменения"
         
-        # Загружаем промпт
-        try:
-            with open("prompt_synopsis_red.txt", "r", encoding="utf-8") as file:
-                prompt_text = file.read()
-        except FileNotFoundError:
-            return None, "Не найден файл prompt_synopsis_red.txt"
-        
-        # Проверяем наличие API ключа
-        if "ANTHROPIC_API_KEY" not in st.secrets:
-            return None, "API ключ Anthropic не найден в секретах"
-        
-        # Инициализируем клиент Claude
-        api_key = str(st.secrets["ANTHROPIC_API_KEY"])
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        # Попытки отправки запроса с обработкой rate limit
-        max_retries = 5  # Увеличиваем количество попыток
-        base_delay = 10  # Начинаем с меньшей задержки
-        
-        for attempt in range(max_retries):
-            try:
-                # Используем экспоненциальную задержку между попытками
-                if attempt > 0:
-                    wait_time = base_delay * (2 ** (attempt - 1))  # 10, 20, 40, 80 секунд
-                    st.info(f"⏳ Попытка {attempt + 1}/{max_retries}. Ожидание {wait_time} секунд...")
-                    time.sleep(wait_time)
-                
-                # Отправляем запрос к Claude
-                message = client.messages.create(
-                    model=get_claude_model(),  # Используем модель, выбранную пользователем
-                    max_tokens=get_max_tokens(),  # Используем правильный лимит для модели
-                    temperature=0.7,
-                    system=prompt_text,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": synopsis_orig
-                        }
-                    ]
-                )
-                
-                result = message.content[0].text
-                print(f"DEBUG: Получен синопсис длиной {len(result)} символов")
-                return result, None
-                
-            except anthropic.RateLimitError as e:
-                error_details = str(e)
-                if "input tokens" in error_details.lower():
-                    if attempt < max_retries - 1:
-                        st.warning(f"⚠️ Превышен лимит входных токенов. Попытка {attempt + 2}/{max_retries} через некоторое время...")
-                        continue
-                    else:
-                        return None, "Синопсис слишком большой. Подождите несколько минут и попробуйте снова."
-                else:
-                    if attempt < max_retries - 1:
-                        continue
-                    else:
-                        return None, "Превышен лимит запросов API. Пожалуйста, подождите 5-10 минут и попробуйте снова."
-                        
-            except Exception as e:
-                error_str = str(e)
-                if "rate_limit" in error_str.lower() or "429" in error_str:
-                    if attempt < max_retries - 1:
-                        continue
-                    else:
-                        return None, "Превышен лимит запросов. Подождите 5-10 минут перед следующей попыткой."
-                elif "timeout" in error_str.lower():
-                    if attempt < max_retries - 1:
-                        st.warning("⏱️ Таймаут запроса. Повторная попытка...")
-                        continue
-                    else:
-                        return None, "Превышено время ожидания ответа. Попробуйте еще раз."
-                else:
-                    return None, f"Ошибка: {error_str[:200]}"
-                    
+        result, error = run_synopsis(
+            "red",
+            synopsis_orig,
+            "Синопсис слишком большой. Подождите несколько минут и попробуйте снова."
+        )
+        if error:
+            return None, error
+        return result["synopsis"], None
     except Exception as e:
         return None, f"Ошибка при создании измененного синопсиса: {str(e)}"
 
+# Функция для получения всех данных референса в рамках текущей операции
+def fetch_reference_data(video_id):
+    """Заполняет данные референса в session_state; возвращает True при успехе"""
+    try:
+        data = run_job("reference", {"video_id": video_id})
+    except DeadlineExceeded as e:
+        st.error(f"⏱️ {e}")
+        return False
+    except Exception as e:
+        st.error(f"❌ Не удалось получить данные референса: {str(e)[:200]}")
+        return False
+    
+    st.session_state.video_title = data["title"]
+    st.session_state.thumbnail_text = data["thumbnail_text"]
+    st.session_state.transcript = data["transcript"]
+    st.session_state.transcript_with_timestamps = data["transcript_with_timestamps"]
+    return True
+
+# Функция для отмены текущей операции (кнопка "Отменить")
+def cancel_active_run(background=False):
+    if background:
+        cancel_background_job()
+        return
+    deadline = st.session_state.get('active_deadline')
+    if deadline is not None:
+        deadline.cancel()
+        st.session_state.run_cancelled = True
+    st.session_state.active_deadline = None
+
+# Функция для отмены фоновой задачи (итог покажет блок состояния фоновой задачи)
+def cancel_background_job():
+    job = st.session_state.get('background_job')
+    if job is not None:
+        job["deadline"].cancel()
+
+# Функция для начала новой операции: дедлайн на всю цепочку шагов и кнопка отмены
+def start_run(seconds=None, background=False):
+    """background=True - долгая задача с сохранением результатов на диск (загрузка канала,
+    ответы на комментарии): она не отменяется при перезапуске скрипта, только кнопкой."""
+    global cancel_button_shown
+    deadline = Deadline(seconds or st.session_state.run_timeout_min * 60)
+    if background:
+        # Одновременно работает одна фоновая задача: новая заменяет прошлую
+        cancel_background_job()
+    else:
+        st.session_state.active_deadline = deadline
+    st.session_state.run_cancelled = False
+    if not cancel_button_shown:
+        st.button("⛔ Отменить", key="cancel_run", on_click=cancel_active_run, args=(background,))
+        cancel_button_shown = True
+    return deadline
+
+cancel_button_shown = False
+
+# Функция для описания события задачи для пользователя (None - не показывать)
+def describe_event(event):
+    if event.get("type") == "retry":
+        return f"⏳ Попытка {event['attempt']}/{event['max_retries']}. Ожидание {event['wait']} секунд..."
+    if event.get("type") == "step":
+        if event["step"] == "title":
+            title = event.get("value", "")
+            return f"✅ Заголовок: {title[:50]}..." if len(title) > 50 else f"✅ Заголовок: {title}"
+        if event["step"] == "thumbnail_text":
+            return "✅ Текст с превью получен"
+        if event["step"] == "transcript":
+            return "✅ Транскрипция получена"
+    return None
+
+# Функция для выполнения задачи (jobs.py) в фоне - в этом процессе или в HTTP API.
+# Основной поток скрипта только ждет результат и показывает события задачи,
+# поэтому нажатие "Отменить" перезапускает страницу сразу, а задача прерывается по дедлайну.
+def run_job(kind, params):
+    deadline = st.session_state.get('active_deadline') or start_run()
+    notices = queue.Queue()
+    
+    def on_event(event):
+        message = describe_event(event)
+        if message:
+            notices.put(message)
+    
+    future = jobs.submit(kind, params, deadline, on_event)
+    return wait_for([future], deadline, notices)[0].result()
+
+# Функция ожидания фоновых задач с обновлением страницы (не блокирует отмену)
+def wait_for(futures, deadline, notices=None, on_done=None, on_tick=None):
+    pending = set(futures)
+    ticker = st.empty()
+    while pending:
+        done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+        for future in done:
+            if on_done is not None:
+                on_done(future)
+        while notices is not None and not notices.empty():
+            st.info(notices.get())
+        if on_tick is not None:
+            on_tick()
+        ticker.caption(f"⏱️ До лимита времени: {deadline.remaining():.0f} с")
+    ticker.empty()
+    return futures
+
+# Функция для массовой загрузки канала или плейлиста в хранилище
+def run_channel_ingest(source_url, workers, use_proxies, limit, timeout_min, slot):
+    deadline = start_run(timeout_min * 60, background=True)
+    progress = queue.Queue()
+    
+    def on_event(event):
+        if event.get("type") == "progress":
+            progress.put((event["stats"], event["video"]))
+    
+    future = jobs.submit(
+        "ingest",
+        {"source_url": source_url, "workers": workers, "use_proxies": use_proxies, "limit": limit},
+        deadline,
+        on_event
+    )
+    st.session_state.background_job = {"kind": "ingest", "deadline": deadline, "future": future}
+    
+    recent = []
+    progress_bar = st.progress(0.0)
+    
+    def on_tick():
+        # Показываем только последние видео - список не растет вместе с каналом
+        stats = None
+        while not progress.empty():
+            stats, meta = progress.get()
+            recent.append({"video_id": meta["video_id"], "title": meta.get("title", ""), "status": meta["status"]})
+            del recent[:-20]
+        if stats is None:
+            return
+        processed = stats["ok"] + stats["unavailable"] + stats["error"] + stats["skipped"]
+        progress_bar.progress(
+            min(1.0, processed / max(stats["listed"], 1)),
+            text=f"{stats['source']}: {processed} из {stats['listed']} (найдено пока)"
+        )
+        slot.dataframe(recent, use_container_width=True)
+    
+    with st.spinner("📥 Загружаю видео и транскрипции..."):
+        wait_for([future], deadline, on_tick=on_tick)
+    
+    st.session_state.background_job = None
+    if show_ingest_result(future):
+        progress_bar.progress(1.0)
+
+# Функция для показа итога загрузки канала (True - загрузка завершена)
+def show_ingest_result(future):
+    try:
+        stats = future.result()
+    except DeadlineExceeded as e:
+        st.error(f"⏱️ {e}. Загруженные видео сохранены - повторный запуск продолжит с места остановки.")
+        return False
+    except Exception as e:
+        st.error(f"❌ Ошибка загрузки: {str(e)[:200]}")
+        return False
+    
+    st.success(
+        f"✅ {stats['source']}: видео {stats['listed']}, с транскрипцией {stats['ok']}, "
+        f"без транскрипции {stats['unavailable']}, ошибок {stats['error']}, "
+        f"уже были загружены {stats['skipped']} ({stats['seconds']} с)"
+    )
+    return True
+
+# Функция для массовых ответов на комментарии к текущему видео
+def run_comment_replies(video_id, max_comments, batch_size, concurrency, timeout_min, slot):
+    if not st.session_state.get('transcript', ''):
+        st.warning("⚠️ Сначала получите данные о видео - транскрипция нужна для контекста ответов")
+        return
+    
+    deadline = start_run(timeout_min * 60, background=True)
+    updates = queue.Queue()
+    
+    def on_event(event):
+        if event.get("type") == "replies":
+            updates.put(event["records"])
+    
+    future = jobs.submit(
+        "replies",
+        {
+            "video_id": video_id,
+            "transcript": st.session_state.transcript,
+            "model": get_claude_model(),
+            "max_tokens": get_max_tokens(),
+            "language": st.session_state.prompt_language,
+            "max_comments": max_comments,
+            "batch_size": batch_size,
+            "concurrency": concurrency,
+        },
+        deadline,
+        on_event
+    )
+    st.session_state.background_job = {"kind": "replies", "deadline": deadline, "future": future}
+    
+    rows = []
+    
+    def on_tick():
+        # Показываем ответы по мере готовности пачек
+        if updates.empty():
+            return
+        while not updates.empty():
+            rows.extend(updates.get())
+        slot.dataframe(rows[-200:], use_container_width=True)
+    
+    with st.spinner("💬 Читаю комментарии и пишу ответы..."):
+        wait_for([future], deadline, on_tick=on_tick)
+    
+    st.session_state.background_job = None
+    show_replies_result(future)
+
+# Функция для показа итога ответов на комментарии
+def show_replies_result(future):
+    try:
+        stats = future.result()
+    except DeadlineExceeded as e:
+        st.error(f"⏱️ {e}. Готовые ответы сохранены - повторный запуск продолжит с места остановки.")
+        return
+    except Exception as e:
+        if error_type(e) == "CommentsUnavailable":
+            st.error(f"❌ {e}")
+        else:
+            st.error(f"❌ Ошибка при ответах на комментарии: {str(e)[:200]}")
+        return
+    
+    st.success(
+        f"✅ Комментариев прочитано: {stats['fetched']}, ответов: {stats['replied']}, "
+        f"ошибок: {stats['failed']}, уже были отвечены: {stats['skipped']}"
+    )
+
+# Фоновые задачи: описание и показ итога
+BACKGROUND_JOBS = {
+    "ingest": ("📥 Загрузка канала", show_ingest_result),
+    "replies": ("💬 Ответы на комментарии", show_replies_result),
+}
+
+# Функция для показа состояния фоновой задачи, пережившей перезапуск скрипта
+def show_background_job():
+    job = st.session_state.background_job
+    if job is None:
+        return
+    title, show_result = BACKGROUND_JOBS[job["kind"]]
+    if job["future"].done():
+        st.session_state.background_job = None
+        show_result(job["future"])
+        return
+    if job["deadline"].cancelled:
+        st.info(f"{title}: останавливается...")
+    else:
+        st.info(
+            f"{title} продолжается в фоне (до лимита времени {job['deadline'].remaining():.0f} с). "
+            "Результаты сохраняются на диск, итог появится здесь после обновления страницы."
+        )
+        st.button("⛔ Остановить", key="cancel_background_job", on_click=cancel_background_job)
+
+# Поля артефактов: подпись и высота текстового поля
+ARTIFACT_FIELDS = {
+    "annotation_orig": ("**Аннотация референса**", 200),
+    "annotation_red": ("**Аннотация изменённая**", 200),
+    "scenario": ("**Сценарий по транскрипции изменённый**", 300),
+    "thumbnail_texts": ("**Тексты для превью**", 300),
+    "summary": ("**Краткое содержание**", 200),
+    "video_comment": ("**Комментарий к видео**", 120),
+}
+
+# Функция для постановки артефактов в очередь (генерация запускается внизу страницы,
+# когда все поля уже отрисованы и их можно заполнять по мере готовности)
+def request_artifacts(names):
+    st.session_state.pending_artifacts = list(names)
+
+# Функция для отрисовки поля артефакта в заранее созданном месте страницы
+def render_artifact(slot, field):
+    label, height = ARTIFACT_FIELDS[field]
+    value = st.session_state.get(field, '')
+    slot.text_area(
+        label,
+        value=value,
+        height=height,
+        key=f"{field}_area_{hash(value)}"
+    )
+
+# Функция для параллельной генерации артефактов на общем контексте референса
+def run_artifact_stage(names, slots):
+    if not st.session_state.get('transcript', ''):
+        st.warning("⚠️ Сначала получите данные о видео")
+        return
+    
+    deadline = start_run()
+    
+    # Тексты для превью строятся по синопсису - создаем его, если еще нет
+    if "thumbnail_texts" in names and not st.session_state.get('synopsis_orig', ''):
+        with st.spinner("🤖 Создаю синопсис референса..."):
+            synopsis, error = create_synopsis_orig()
+        if error:
+            st.error(f"❌ {error}")
+            return
+        st.session_state.synopsis_orig = synopsis
+        st.success(f"✅ Синопсис референса создан ({len(synopsis)} символов)")
+    
+    params = {
+        "transcript": st.session_state.transcript,
+        "synopsis": st.session_state.get('synopsis_orig', ''),
+        "thumbnail_text": st.session_state.get('thumbnail_text', ''),
+        "title": st.session_state.get('video_title', ''),
+        "model": get_claude_model(),
+        "max_tokens": get_max_tokens(),
+        "language": st.session_state.prompt_language,
+    }
+    
+    started = time.time()
+    futures = jobs.start_artifacts(names, params, deadline)
+    names_by_future = {future: name for name, future in futures.items()}
+    
+    def on_done(future):
+        title = generation.ARTIFACTS[names_by_future[future]]["title"]
+        try:
+            fields = future.result()
+        except DeadlineExceeded as e:
+            st.error(f"⏱️ {title}: {e}")
+            return
+        except Exception as e:
+            st.error(f"❌ {title}: {str(e)[:200]}")
+            return
+        
+        # Заполняем поля сразу, не дожидаясь остальных артефактов
+        for field, text in fields.items():
+            st.session_state[field] = text
+            render_artifact(slots[field], field)
+        st.success(f"✅ {title} готово за {time.time() - started:.0f} с")
+    
+    titles = ", ".join(generation.ARTIFACTS[name]["title"] for name in names)
+    with st.spinner(f"🤖 Создаю: {titles}..."):
+        wait_for(list(names_by_future), deadline, on_done=on_done)
+
+# Дедлайн действует в пределах одного запуска скрипта. Если прошлый запуск прервало
+# действие пользователя, его задачи еще работают, а результат уже не нужен - отменяем их
+# (для завершенных задач отмена ничего не делает). Фоновые задачи сохраняют результаты
+# на диск и отменяются только кнопкой
+if st.session_state.active_deadline is not None:
+    st.session_state.active_deadline.cancel()
+st.session_state.active_deadline = None
+
 # Проверяем, нужна ли перезагрузка страницы
 if st.session_state.get('need_rerun', False):
     st.session_state.need_rerun = False
@@ -486,6 +552,27 @@ with st.sidebar:
         ["Claude Opus 4", "Claude Sonnet 4.5", "Claude Opus 4.5", "Claude Sonnet 4.1"],
         index=0
     )
+    prompt_languages = {"English": "en", "Русский": "ru"}
+    prompt_language = st.selectbox(
+        "Язык промптов для материалов:",
+        list(prompt_languages.keys()),
+        index=0
+    )
+    st.session_state.prompt_language = prompt_languages[prompt_language]
+    st.session_state.run_timeout_min = st.number_input(
+        "⏱️ Лимит времени на операцию (мин):",
+        min_value=1,
+        max_value=60,
+        value=st.session_state.run_timeout_min,
+        help="Загрузка канала и ответы на комментарии задают свой лимит"
+    )
+    st.session_state.reuse_threshold = st.slider(
+        "♻️ Похожесть для повторного использования синопсиса (%):",
+        min_value=50,
+        max_value=100,
+        value=st.session_state.reuse_threshold,
+        help="Если транскрипция похожа на уже обработанную не меньше, чем на этот процент, берется готовый синопсис без запроса к Claude"
+    )
     st.info(f"Текущая модель: {st.session_state.selected_model}")
     st.info(f"Максимум токенов для ответа: {get_max_tokens()}")
     
@@ -498,6 +585,12 @@ with st.sidebar:
         - Используется выбранная вами модель Claude
         - При ошибке автоматически делается до 5 попыток с увеличивающейся задержкой
         - Задержки: 10, 20, 40, 80 секунд между попытками
+        - Вся операция ограничена лимитом времени из настроек: если очередная попытка
+          не успевает до лимита, операция сразу завершается с объяснением
+        - Кнопка "⛔ Отменить" прерывает текущие запросы
+        - Можно задать несколько ключей ANTHROPIC_API_KEY_1..N: каждый запрос уходит
+          через ключ с наибольшим запасом лимитов, а ключ, получивший 429, отдыхает,
+          пока остальные продолжают работать
         
         **Проблема с большими запросами:**
         - Промпт для синопсисов содержит ~40000 символов примеров
@@ -529,17 +622,34 @@ with st.sidebar:
         st.write(f"- transcript length: {len(st.session_state.get('transcript', ''))}")
         st.write(f"- synopsis_orig length: {len(st.session_state.get('synopsis_orig', ''))}")
         st.write(f"- synopsis_red length: {len(st.session_state.get('synopsis_red', ''))}")
+        for field in ARTIFACT_FIELDS:
+            st.write(f"- {field} length: {len(st.session_state.get(field, ''))}")
         
         st.write("\nSecrets Status:")
         try:
             st.write(f"- Secrets available: {hasattr(st, 'secrets')}")
             if hasattr(st, 'secrets'):
                 st.write(f"- Total secrets: {len(list(st.secrets.keys()))}")
-                st.write(f"- ANTHROPIC_API_KEY: {'✅ Found' if 'ANTHROPIC_API_KEY' in st.secrets else '❌ Not found'}")
+                st.write(f"- Anthropic keys: {len(resources.get_anthropic_api_keys())}")
                 st.write(f"- YouTube keys: {sum(1 for k in st.secrets.keys() if k.startswith('YOUTUBE_API_KEY_'))}")
         except Exception as e:
             st.write(f"- Error checking secrets: {e}")
         
+        warmup = resources.get_warmup_info()
+        st.write(f"- Warmup: {'✅ ready' if warmup['ready'] else '⏳ in progress'} {warmup.get('seconds', '')}")
+        if warmup['error']:
+            st.write(f"- Warmup error: {warmup['error']}")
+        
+        st.write(f"- Jobs: {'HTTP API ' + api_client.get_api_url() if api_client.is_enabled() else 'in process'}")
+        pool = anthropic_pool.get_pool()
+        if pool is not None:
+            for key in pool.snapshot():
+                cooldown = f", cooldown {key['cooldown']} s" if key['cooldown'] else ""
+                st.write(
+                    f"- Anthropic key {key['key']}: headroom {key['headroom']:.0%}, "
+                    f"in flight {key['in_flight']}, calls {key['calls']}, 429: {key['rate_limited']}{cooldown}"
+                )
+        
         if st.button("🔄 Очистить данные"):
             st.session_state.video_id = None
             st.session_state.video_title = ""
@@ -548,8 +658,19 @@ with st.sidebar:
             st.session_state.transcript_with_timestamps = ""
             st.session_state.synopsis_orig = ""
             st.session_state.synopsis_red = ""
+            st.session_state.synopsis_reused_from = None
+            st.session_state.skip_synopsis_reuse = False
+            st.session_state.transcript_export = None
+            for field in ARTIFACT_FIELDS:
+                st.session_state[field] = ""
             st.rerun()
 
+if st.session_state.run_cancelled:
+    st.session_state.run_cancelled = False
+    st.warning("⛔ Операция отменена")
+
+show_background_job()
+
 # Основной контент
 st.markdown("### 📹 Введите ссылку на YouTube видео или ID видео")
 
@@ -571,32 +692,85 @@ if submitted and video_input:
     else:
         # Сохраняем ID
         st.session_state.video_id = video_id
+        st.session_state.synopsis_reused_from = None
+        st.session_state.skip_synopsis_reuse = False
+        st.session_state.transcript_export = None
         
         # Создаем контейнер для сообщений о прогрессе
         progress_container = st.container()
         
         with progress_container:
-            with st.spinner("📝 Получение заголовка видео..."):
-                title = get_video_title(video_id)
-                st.session_state.video_title = title if title else ""
-                st.success(f"✅ Заголовок получен: {title[:50]}..." if title and len(title) > 50 else f"✅ Заголовок: {title}")
-            
-            with st.spinner("🖼️ Анализ превью видео..."):
-                thumbnail_text = get_thumbnail_text(video_id)
-                st.session_state.thumbnail_text = thumbnail_text if thumbnail_text else ""
-                st.success("✅ Текст с превью получен")
-            
-            with st.spinner("📄 Получение транскрипции..."):
-                transcript, transcript_with_timestamps = get_video_transcript(video_id)
-                st.session_state.transcript = transcript if transcript else ""
-                st.session_state.transcript_with_timestamps = transcript_with_timestamps if transcript_with_timestamps else ""
-                st.success("✅ Транскрипция получена")
-            
-            st.balloons()
-            st.success(f"🎉 Все данные успешно загружены для видео ID: {video_id}")
-            
-            # Важно: перезагружаем страницу после получения данных
-            st.rerun()
+            start_run()
+            # Заголовок, превью и транскрипция - одна задача; шаги показываются по мере готовности
+            with st.spinner("📥 Получение заголовка, превью и транскрипции..."):
+                loaded = fetch_reference_data(video_id)
+            if loaded:
+                st.balloons()
+                st.success(f"🎉 Все данные успешно загружены для видео ID: {video_id}")
+                
+                # Важно: перезагружаем страницу после получения данных
+                st.rerun()
+
+# Массовая загрузка канала или плейлиста
+with st.expander("📺 Загрузка канала или плейлиста"):
+    source_input = st.text_input(
+        "Ссылка на канал или плейлист:",
+        placeholder="https://www.youtube.com/@channel, .../channel/UC..., ...?list=PL..."
+    )
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        ingest_workers = st.number_input("Параллельных загрузок:", min_value=1, max_value=32, value=8)
+    with col2:
+        ingest_limit = st.number_input("Максимум видео (0 - все):", min_value=0, max_value=20000, value=0, step=50)
+    with col3:
+        ingest_timeout_min = st.number_input(
+            "⏱️ Лимит времени (мин):",
+            min_value=1,
+            max_value=24 * 60,
+            value=ingest.DEFAULT_INGEST_DEADLINE // 60,
+            key="ingest_timeout_min"
+        )
+    with col4:
+        ingest_use_proxies = st.checkbox("Использовать прокси", value=True)
+    
+    ingest_slot = st.empty()
+    if st.button("📥 Загрузить видео", key="ingest_source"):
+        if not ingest.parse_source(source_input):
+            st.error("❌ Некорректная ссылка на канал или плейлист")
+        else:
+            run_channel_ingest(
+                source_input,
+                int(ingest_workers),
+                ingest_use_proxies,
+                int(ingest_limit) or None,
+                int(ingest_timeout_min),
+                ingest_slot
+            )
+
+# Поиск по уже обработанным референсам
+with st.expander("🔎 Поиск по обработанным референсам"):
+    search_query = st.text_input(
+        "Ключевые слова:",
+        placeholder="слова из транскрипции, заголовка или синопсиса"
+    )
+    if search_query:
+        started = time.time()
+        try:
+            results = search_index.search(search_query)
+        except Exception as e:
+            st.error(f"❌ Ошибка поиска: {str(e)[:200]}")
+            results = []
+        st.caption(f"Найдено: {len(results)} за {(time.time() - started) * 1000:.0f} мс")
+        for result in results:
+            synopsis_mark = " 📚" if result["has_synopsis"] else ""
+            st.markdown(
+                f"**[{result['title'] or result['video_id']}](https://www.youtube.com/watch?v={result['video_id']})**"
+                f"{synopsis_mark}  \n{result['snippet']}"
+            )
+    if st.button("🗂️ Проиндексировать загруженные видео", key="index_store"):
+        with st.spinner("Индексация хранилища..."):
+            indexed = search_index.index_store()
+        st.success(f"✅ Добавлено в индекс: {indexed}, всего референсов: {search_index.count()}")
 
 # Секция данных референса
 st.markdown("---")
@@ -652,35 +826,53 @@ with data_container:
             key=f"transcript_display_{hash(current_transcript)}_{show_timestamps}"
         )
 
+        # Субтитры с точным временем сегментов из хранилища
+        stored_meta = store.load_meta(st.session_state.video_id) if st.session_state.video_id else None
+        if stored_meta and stored_meta.get("status", "ok") == "ok":
+            export_format = st.selectbox(
+                "Формат субтитров",
+                options=[fmt.upper() for fmt in export.FORMATS],
+                key="export_format"
+            ).lower()
+            # Файл собирается только по кнопке: при каждом перезапуске скрипта читать его незачем.
+            # Готовый файл привязан к видео, формату и времени сохранения в хранилище.
+            export_key = (st.session_state.video_id, export_format, stored_meta.get("saved_at"))
+            prepared = st.session_state.transcript_export
+            if prepared is not None and prepared["key"] != export_key:
+                prepared = None
+            if prepared is None and st.button(f"📦 Подготовить субтитры ({export_format.upper()})", key="prepare_export"):
+                try:
+                    _, chunks = export.open_video(st.session_state.video_id, export_format)
+                    prepared = {"key": export_key, "data": b"".join(chunks)}
+                    st.session_state.transcript_export = prepared
+                except (FileNotFoundError, ValueError) as e:
+                    st.error(f"❌ Не удалось подготовить субтитры: {e}")
+            if prepared is not None:
+                st.download_button(
+                    f"⬇️ Скачать транскрипцию ({export_format.upper()})",
+                    data=prepared["data"],
+                    file_name=f"{st.session_state.video_id}.{export.FORMATS[export_format]['extension']}",
+                    mime=export.FORMATS[export_format]["mime"]
+                )
+
 # Секция аннотаций
 st.markdown("---")
 st.markdown("### 📝 Аннотации")
 
+# Места для полей артефактов - заполняются по мере готовности генерации
+artifact_slots = {}
+
 col1, col2 = st.columns(2)
 
 with col1:
-    annotation_orig = st.text_area(
-        "**Аннотация референса**",
-        height=200,
-        key="annotation_orig"
-    )
-    if st.button("🔨 Создать", key="create_annotation_orig"):
-        if not st.session_state.video_id:
-            st.warning("⚠️ Сначала получите данные о видео")
-        else:
-            st.info("🚧 Функция в разработке")
+    artifact_slots["annotation_orig"] = st.empty()
+    render_artifact(artifact_slots["annotation_orig"], "annotation_orig")
+    st.button("🔨 Создать", key="create_annotation_orig", on_click=request_artifacts, args=(["annotation"],))
 
 with col2:
-    annotation_red = st.text_area(
-        "**Аннотация изменённая**",
-        height=200,
-        key="annotation_red"
-    )
-    if st.button("🔨 Создать", key="create_annotation_red"):
-        if not st.session_state.video_id:
-            st.warning("⚠️ Сначала получите данные о видео")
-        else:
-            st.info("🚧 Функция в разработке")
+    artifact_slots["annotation_red"] = st.empty()
+    render_artifact(artifact_slots["annotation_red"], "annotation_red")
+    st.button("🔨 Создать", key="create_annotation_red", on_click=request_artifacts, args=(["annotation"],))
 
 # Секция синопсисов
 st.markdown("---")
@@ -700,6 +892,7 @@ with col1:
     )
     
     if st.button("🔨 Создать", key="create_synopsis_orig"):
+        start_run()
         # Проверяем наличие транскрипции
         if not st.session_state.get('transcript', ''):
             # Если нет транскрипции, проверяем video_id
@@ -708,18 +901,8 @@ with col1:
             else:
                 # Есть video_id, но нет транскрипции - получаем все данные
                 with st.spinner("📝 Получение данных о видео..."):
-                    # Получаем заголовок
-                    title = get_video_title(st.session_state.video_id)
-                    st.session_state.video_title = title if title else ""
-                    
-                    # Получаем текст с превью
-                    thumbnail_text = get_thumbnail_text(st.session_state.video_id)
-                    st.session_state.thumbnail_text = thumbnail_text if thumbnail_text else ""
-                    
-                    # Получаем транскрипцию
-                    transcript, transcript_with_timestamps = get_video_transcript(st.session_state.video_id)
-                    st.session_state.transcript = transcript if transcript else ""
-                    st.session_state.transcript_with_timestamps = transcript_with_timestamps if transcript_with_timestamps else ""
+                    # Получаем заголовок, текст с превью и транскрипцию
+                    fetch_reference_data(st.session_state.video_id)
                     
                     if not st.session_state.transcript:
                         st.error("❌ Не удалось получить транскрипцию видео")
@@ -762,6 +945,7 @@ with col2:
     )
     
     if st.button("🔨 Создать", key="create_synopsis_red"):
+        start_run()
         # Проверяем наличие оригинального синопсиса
         if not st.session_state.get('synopsis_orig', ''):
             # Если нет оригинального синопсиса, проверяем транскрипцию
@@ -772,18 +956,8 @@ with col2:
                 else:
                     # Есть video_id, но нет транскрипции - получаем все данные
                     with st.spinner("📝 Получение данных о видео..."):
-                        # Получаем заголовок
-                        title = get_video_title(st.session_state.video_id)
-                        st.session_state.video_title = title if title else ""
-                        
-                        # Получаем текст с превью
-                        thumbnail_text = get_thumbnail_text(st.session_state.video_id)
-                        st.session_state.thumbnail_text = thumbnail_text if thumbnail_text else ""
-                        
-                        # Получаем транскрипцию
-                        transcript, transcript_with_timestamps = get_video_transcript(st.session_state.video_id)
-                        st.session_state.transcript = transcript if transcript else ""
-                        st.session_state.transcript_with_timestamps = transcript_with_timestamps if transcript_with_timestamps else ""
+                        # Получаем заголовок, текст с превью и транскрипцию
+                        fetch_reference_data(st.session_state.video_id)
                         
                         if not st.session_state.transcript:
                             st.error("❌ Не удалось получить транскрипцию видео")
@@ -842,19 +1016,106 @@ with col2:
                         st.text_area("", value=synopsis_red, height=400, key="synopsis_red_result_3")
 
 # Секция сценария
+# Сообщение о синопсисе, взятом у похожего референса
+reused_from = st.session_state.synopsis_reused_from
+if reused_from and st.session_state.get('synopsis_orig', ''):
+    st.info(
+        f"♻️ Транскрипция на {reused_from['similarity'] * 100:.0f}% совпадает с уже обработанным референсом "
+        f"«{reused_from['title'] or reused_from['video_id']}» ({reused_from['video_id']}) - "
+        "синопсис взят из него без запроса к Claude."
+    )
+    st.button(
+        "🆕 Не использовать, создать синопсис заново",
+        key="reject_reused_synopsis",
+        on_click=reject_reused_synopsis
+    )
+
 st.markdown("---")
 st.markdown("### 🎭 Сценарий")
 
-scenario = st.text_area(
-    "**Сценарий по транскрипции изменённый**",
-    height=300,
-    key="scenario"
+artifact_slots["scenario"] = st.empty()
+render_artifact(artifact_slots["scenario"], "scenario")
+st.button("🔨 Создать", key="create_scenario", on_click=request_artifacts, args=(["scenario"],))
+
+# Секция пакета материалов
+st.markdown("---")
+st.markdown("### 📦 Пакет материалов")
+
+col1, col2 = st.columns(2)
+
+with col1:
+    artifact_slots["thumbnail_texts"] = st.empty()
+    render_artifact(artifact_slots["thumbnail_texts"], "thumbnail_texts")
+    st.button("🔨 Создать", key="create_thumbnail_texts", on_click=request_artifacts, args=(["thumbnail_texts"],))
+
+with col2:
+    artifact_slots["summary"] = st.empty()
+    render_artifact(artifact_slots["summary"], "summary")
+    st.button("🔨 Создать", key="create_summary", on_click=request_artifacts, args=(["summary"],))
+
+st.button(
+    "🚀 Создать все материалы параллельно",
+    key="create_package",
+    type="primary",
+    on_click=request_artifacts,
+    args=(list(generation.ARTIFACTS),)
 )
-if st.button("🔨 Создать", key="create_scenario"):
+
+# Секция комментариев
+st.markdown("---")
+st.markdown("### 💬 Комментарии")
+
+artifact_slots["video_comment"] = st.empty()
+render_artifact(artifact_slots["video_comment"], "video_comment")
+st.button("🔨 Создать", key="create_video_comment", on_click=request_artifacts, args=(["comment"],))
+
+st.markdown("**Ответы на комментарии зрителей**")
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    max_comments = st.number_input("Сколько комментариев обработать:", min_value=10, max_value=5000, value=200, step=10)
+with col2:
+    reply_batch_size = st.number_input("Комментариев в одном запросе:", min_value=1, max_value=50, value=20)
+with col3:
+    reply_concurrency = st.number_input("Параллельных запросов:", min_value=1, max_value=16, value=4)
+with col4:
+    replies_timeout_min = st.number_input(
+        "⏱️ Лимит времени (мин):",
+        min_value=1,
+        max_value=12 * 60,
+        value=comments.DEFAULT_REPLIES_DEADLINE // 60,
+        key="replies_timeout_min"
+    )
+
+replies_slot = st.empty()
+if st.button("💬 Ответить на комментарии", key="reply_to_comments"):
     if not st.session_state.video_id:
         st.warning("⚠️ Сначала получите данные о видео")
     else:
-        st.info("🚧 Функция в разработке")
+        run_comment_replies(
+            st.session_state.video_id,
+            int(max_comments),
+            int(reply_batch_size),
+            int(reply_concurrency),
+            int(replies_timeout_min),
+            replies_slot
+        )
+
+if st.session_state.video_id:
+    replies_path = os.path.join(comments.REPLIES_DIR, f"{st.session_state.video_id}.jsonl")
+    if os.path.exists(replies_path):
+        with open(replies_path, "rb") as file:
+            st.download_button(
+                "⬇️ Скачать ответы (JSONL)",
+                data=file.read(),
+                file_name=f"replies_{st.session_state.video_id}.jsonl",
+                mime="application/json"
+            )
+
+# Генерация запрошенных артефактов (все поля уже на странице)
+if st.session_state.pending_artifacts:
+    pending = st.session_state.pending_artifacts
+    st.session_state.pending_artifacts = []
+    run_artifact_stage(pending, artifact_slots)
 
 # Footer с информацией
 st.markdown("---")
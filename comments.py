@@ -0,0 +1,263 @@
+"""Массовые ответы на комментарии к видео.
+
+Комментарии постранично читаются через commentThreads.list (с ротацией ключей
+YouTube API) и поступают в очередь. Из очереди они собираются в пачки: одна
+пачка - один запрос к Claude со структурированным ответом по каждому комментарию.
+Пачки обрабатываются параллельно с ограничением, а ответы сразу дописываются
+в файл data/replies/<video_id>.jsonl, поэтому прерванный запуск можно продолжить.
+"""
+import os
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import resources
+import generation
+from deadline import Deadline, DeadlineExceeded
+
+# Максимальный размер страницы commentThreads.list
+PAGE_SIZE = 100
+
+# Оценка токенов ответа на один комментарий (объект JSON с id и текстом ответа);
+# пачка не больше max_tokens / REPLY_TOKENS комментариев, чтобы ответ не обрезался
+REPLY_TOKENS = 200
+
+# Лимит времени на ответы к комментариям видео по умолчанию (секунды)
+DEFAULT_REPLIES_DEADLINE = 3600
+
+REPLIES_DIR = os.path.join(resources.DATA_DIR, "replies")
+
+# Инструкция к пачке комментариев (добавляется после промпта ответа)
+BATCH_INSTRUCTIONS = """Apply the instruction above to EACH User's comment below separately.
+The comments are given as a JSON array of objects with "id", "author" and "text".
+Return ONLY a JSON array of objects {"id": "<comment id>", "reply": "<your reply>"}: one object per comment, in the same order, without any other text.
+
+User's comments:
+"""
+
+
+class CommentsUnavailable(Exception):
+    """Комментарии к видео отключены или недоступны"""
+
+
+# Функция для постраничного получения комментариев верхнего уровня
+def iter_comment_threads(video_id, deadline=None, max_comments=None, order="relevance"):
+    """Генератор словарей {id, author, text, likes}. Ключи YouTube API перебираются при исчерпании квоты"""
+    from googleapiclient.errors import HttpError
+
+    api_keys = resources.get_youtube_api_keys()
+    if not api_keys:
+        raise CommentsUnavailable("Не найдены ключи YOUTUBE_API_KEY_1..N")
+
+    key_index = 0
+    page_token = None
+    count = 0
+    while True:
+        youtube = resources.get_youtube_client(api_keys[key_index])
+        request = youtube.commentThreads().list(
+            part="snippet",
+            videoId=video_id,
+            maxResults=PAGE_SIZE,
+            order=order,
+            textFormat="plainText",
+            pageToken=page_token
+        )
+        try:
+            response = resources.execute_youtube(request, deadline)
+        except HttpError as e:
+            if "quota" in str(e).lower() and key_index + 1 < len(api_keys):
+                key_index += 1  # Повторяем ту же страницу со следующим ключом
+                continue
+            if "commentsDisabled" in str(e) or "disabled comments" in str(e).lower():
+                raise CommentsUnavailable("Комментарии к этому видео отключены")
+            raise CommentsUnavailable(f"Ошибка YouTube API: {str(e)[:200]}")
+
+        for item in response.get("items", []):
+            snippet = item["snippet"]["topLevelComment"]["snippet"]
+            yield {
+                "id": item["id"],
+                "author": snippet.get("authorDisplayName", ""),
+                "text": snippet.get("textDisplay", ""),
+                "likes": snippet.get("likeCount", 0),
+            }
+            count += 1
+            if max_comments and count >= max_comments:
+                return
+
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return
+
+
+# Функция для чтения уже сохранённых ответов (для продолжения прерванного запуска)
+def load_replied_ids(path):
+    replied = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("reply"):
+                    replied.add(record["comment_id"])
+    return replied
+
+
+# Функция для разбора ответа Claude в словарь {id комментария: ответ}
+def parse_batch_replies(text):
+    """Если ответ обрезан по max_tokens, возвращает ответы из полных объектов массива"""
+    start = text.find("[")
+    if start < 0:
+        raise ValueError("Claude не вернул JSON-массив ответов")
+    decoder = json.JSONDecoder()
+    replies = {}
+    pos = start + 1
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            break
+        try:
+            item, pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            break  # Обрезанный объект - остальные комментарии пачки останутся без ответа
+        if isinstance(item, dict) and item.get("id") and item.get("reply"):
+            replies[str(item["id"])] = str(item["reply"]).strip()
+    return replies
+
+
+# Функция для генерации ответов на пачку комментариев одним запросом
+def reply_to_batch(pool, model, max_tokens, context, prompt_text, batch, deadline=None):
+    payload = json.dumps(
+        [{"id": c["id"], "author": c["author"], "text": c["text"]} for c in batch],
+        ensure_ascii=False
+    )
+    result = generation.with_retries(
+        lambda: generation.generate_text(
+            pool, model, max_tokens, context, prompt_text + "\n\n" + BATCH_INSTRUCTIONS + payload,
+            deadline=deadline
+        ),
+        deadline=deadline,
+        pool=pool
+    )
+    return parse_batch_replies(result)
+
+
+# Функция для массовой генерации ответов на комментарии к видео
+def run_reply_pipeline(video_id, transcript, pool, model, max_tokens, language="en",
+                       max_comments=200, batch_size=20, concurrency=4,
+                       deadline=None, on_replies=None):
+    """Возвращает статистику {fetched, replied, failed, skipped, path}.
+
+    on_replies(records) вызывается из фонового потока для каждой готовой пачки.
+    """
+    deadline = deadline or Deadline(DEFAULT_REPLIES_DEADLINE)
+    batch_size = max(1, min(batch_size, max_tokens // REPLY_TOKENS))
+    prompt_text = resources.load_prompt(
+        generation.get_prompt_filename("prompt_reply_to_users_comment.txt", language)
+    )
+    # Транскрипция - общий для всех пачек кешируемый контекст
+    context = generation.build_context(transcript)
+
+    os.makedirs(REPLIES_DIR, exist_ok=True)
+    path = os.path.join(REPLIES_DIR, f"{video_id}.jsonl")
+    replied_ids = load_replied_ids(path)
+    stats = {"fetched": 0, "replied": 0, "failed": 0, "skipped": 0, "path": path}
+
+    # Производитель: страницы комментариев -> очередь (ограниченная, чтобы не обгонять Claude)
+    comments_queue = queue.Queue(maxsize=batch_size * concurrency * 2)
+    producer_error = []
+    # Потребитель остановился (в том числе с ошибкой) - производителю больше некому отдавать комментарии
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for comment in iter_comment_threads(video_id, deadline, max_comments=max_comments):
+                if stop.is_set():
+                    return
+                stats["fetched"] += 1
+                if comment["id"] in replied_ids:
+                    stats["skipped"] += 1
+                    continue
+                while not stop.is_set():
+                    deadline.check("чтение комментариев")
+                    try:
+                        comments_queue.put(comment, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+        except Exception as e:
+            producer_error.append(e)
+        finally:
+            # Сигнал окончания; если потребитель уже остановлен - не ждём
+            while not stop.is_set():
+                try:
+                    comments_queue.put(None, timeout=0.5)
+                    break
+                except queue.Full:
+                    if deadline.cancelled or deadline.remaining() <= 0:
+                        break
+
+    producer = threading.Thread(target=produce, name=f"comments-{video_id}", daemon=True)
+    producer.start()
+
+    write_lock = threading.Lock()
+
+    def process(batch):
+        try:
+            replies = reply_to_batch(pool, model, max_tokens, context, prompt_text, batch, deadline)
+            error = None
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            replies, error = {}, str(e)[:200]
+
+        records = []
+        for comment in batch:
+            record = {"comment_id": comment["id"], "author": comment["author"], "comment": comment["text"]}
+            if comment["id"] in replies:
+                record["reply"] = replies[comment["id"]]
+            else:
+                record["error"] = error or "Claude не вернул ответ на этот комментарий"
+            records.append(record)
+
+        # Дописываем ответы сразу, чтобы результат не терялся при обрыве
+        with write_lock:
+            with open(path, "a", encoding="utf-8") as file:
+                for record in records:
+                    file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            stats["replied"] += sum(1 for r in records if "reply" in r)
+            stats["failed"] += sum(1 for r in records if "error" in r)
+        if on_replies is not None:
+            on_replies(records)
+
+    # Потребитель: пачки из очереди -> запросы к Claude, не больше concurrency одновременно
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="replies") as executor:
+        try:
+            in_flight = set()
+            batch = []
+            finished = False
+            while not finished:
+                comment = comments_queue.get()
+                if comment is None:
+                    finished = True
+                else:
+                    batch.append(comment)
+                if batch and (len(batch) >= batch_size or finished):
+                    if len(in_flight) >= concurrency:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    in_flight.add(executor.submit(process, batch))
+                    batch = []
+            for future in in_flight:
+                future.result()
+        finally:
+            stop.set()
+            producer.join(timeout=5)
+
+    if producer_error:
+        raise producer_error[0]
+    return stats
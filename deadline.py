@@ -0,0 +1,84 @@
+"""Сквозной дедлайн и отмена для длительных операций.
+
+Deadline передаётся во все HTTP-запросы, повторные попытки и паузы пайплайна:
+таймаут каждого запроса не превышает оставшееся время, а пауза перед повтором
+сразу завершается ошибкой, если после неё не останется времени на попытку.
+"""
+import time
+import threading
+
+
+class DeadlineExceeded(Exception):
+    """Операция не успевает завершиться до дедлайна"""
+
+
+class Cancelled(DeadlineExceeded):
+    """Операция отменена пользователем"""
+
+
+class Deadline:
+    def __init__(self, seconds, cancel_event=None):
+        # Время по часам системы, чтобы дедлайн можно было передать в другой процесс
+        self.expires_at = time.time() + seconds
+        self.seconds = seconds
+        self._cancel_event = cancel_event if cancel_event is not None else threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.time())
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Отменяет операцию и прерывает зарегистрированные запросы"""
+        self._cancel_event.set()
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback):
+        """Регистрирует функцию, прерывающую текущий запрос; возвращает функцию снятия"""
+        with self._lock:
+            self._callbacks.append(callback)
+        if self.cancelled:
+            self.cancel()
+
+        def remove():
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+        return remove
+
+    def check(self, what="операция"):
+        if self.cancelled:
+            raise Cancelled("Операция отменена пользователем")
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Истек лимит времени {self.seconds:.0f} с ({what})")
+
+    def timeout(self, cap=None, what="запрос"):
+        """Таймаут для очередного запроса: не больше cap и не больше оставшегося времени"""
+        self.check(what)
+        remaining = self.remaining()
+        return min(cap, remaining) if cap else remaining
+
+    def require(self, seconds, what="операция"):
+        """Сразу завершает операцию, если до дедлайна осталось меньше seconds"""
+        self.check(what)
+        remaining = self.remaining()
+        if seconds > remaining:
+            raise DeadlineExceeded(
+                f"Не успеть до дедлайна: {what} требует {seconds:.0f} с, осталось {remaining:.0f} с"
+            )
+
+    def sleep(self, seconds, reserve=0, what="повторная попытка"):
+        """Пауза с учетом дедлайна. reserve - сколько времени нужно после паузы"""
+        self.require(seconds + reserve, what)
+        if self._cancel_event.wait(seconds):
+            raise Cancelled("Операция отменена пользователем")
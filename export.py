@@ -0,0 +1,178 @@
+"""Экспорт транскрипций из хранилища в SRT, WebVTT и JSON Lines.
+
+Сегменты читаются из data/videos/<video_id>.jsonl построчно и сразу
+превращаются в текст субтитров генераторами, поэтому даже многочасовая
+транскрипция не собирается в памяти целиком. Время берется из хранилища
+без округления до секунд: начало - start, конец - start + duration.
+Массовый экспорт проходит по каждому файлу хранилища один раз.
+"""
+import re
+import json
+import zipfile
+
+import store
+
+# Размер блока, которыми текст отдается наружу (байты)
+CHUNK_SIZE = 64 * 1024
+
+# Форматы экспорта: расширение файла и MIME-тип
+FORMATS = {
+    "srt": {"extension": "srt", "mime": "application/x-subrip"},
+    "vtt": {"extension": "vtt", "mime": "text/vtt"},
+    "jsonl": {"extension": "jsonl", "mime": "application/x-ndjson"},
+}
+
+VIDEO_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+# Функция для форматирования времени субтитров: HH:MM:SS,mmm (SRT) или HH:MM:SS.mmm (VTT)
+def format_timestamp(seconds, separator=","):
+    total_ms = max(0, int(round(seconds * 1000)))
+    hours, rest = divmod(total_ms, 3600 * 1000)
+    minutes, rest = divmod(rest, 60 * 1000)
+    secs, ms = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{ms:03d}"
+
+
+# Функция для получения начала и конца сегмента (секунды)
+def segment_times(segment):
+    start = float(segment["start"])
+    return start, start + float(segment.get("duration") or 0)
+
+
+# Функция для текста субтитра: пустая строка внутри субтитра завершила бы его раньше времени
+def _cue_text(text):
+    return "\n".join(line.strip() for line in str(text).splitlines() if line.strip())
+
+
+# Генератор субтитров SRT
+def iter_srt(segments):
+    index = 0
+    for segment in segments:
+        text = _cue_text(segment["text"])
+        if not text:
+            continue
+        index += 1
+        start, end = segment_times(segment)
+        yield f"{index}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{text}\n\n"
+
+
+# Генератор субтитров WebVTT
+def iter_vtt(segments):
+    yield "WEBVTT\n\n"
+    for segment in segments:
+        text = _cue_text(segment["text"])
+        if not text:
+            continue
+        # В VTT символы &, < и > - разметка, а "-->" недопустима в тексте
+        text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        start, end = segment_times(segment)
+        yield f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n{text}\n\n"
+
+
+# Генератор строк JSON Lines: по объекту на сегмент
+def iter_jsonl(segments, video_id=None):
+    for index, segment in enumerate(segments):
+        start, end = segment_times(segment)
+        record = {
+            "video_id": video_id,
+            "index": index,
+            "start": start,
+            "end": round(end, 3),
+            "duration": float(segment.get("duration") or 0),
+            "text": segment["text"],
+        }
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+WRITERS = {
+    "srt": lambda segments, video_id: iter_srt(segments),
+    "vtt": lambda segments, video_id: iter_vtt(segments),
+    "jsonl": iter_jsonl,
+}
+
+
+# Генератор блоков байтов: склеивает мелкие строки, чтобы не писать в сокет по субтитру
+def iter_chunks(texts, size=CHUNK_SIZE):
+    buffer = []
+    buffered = 0
+    for text in texts:
+        data = text.encode("utf-8")
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt} (доступны: {', '.join(FORMATS)})")
+
+
+# Функция для экспорта одного видео
+def open_video(video_id, fmt="srt"):
+    """Возвращает (метаданные, генератор блоков байтов).
+
+    Файл открывается и метаданные читаются сразу, поэтому отсутствующее видео
+    дает FileNotFoundError до начала отдачи, а сегменты читаются по мере
+    чтения генератора.
+    """
+    _check_format(fmt)
+    if not VIDEO_ID_PATTERN.match(video_id or ""):
+        raise ValueError(f"Некорректный ID видео: {video_id}")
+    records = store.iter_video(video_id)
+    meta = next(records)
+    return meta, iter_chunks(WRITERS[fmt](records, video_id))
+
+
+# Генератор видео для массового экспорта: (video_id, метаданные, генератор сегментов)
+def _iter_exportable(video_ids=None):
+    for video_id in (video_ids if video_ids is not None else store.iter_video_ids()):
+        if not VIDEO_ID_PATTERN.match(video_id):
+            continue
+        records = store.iter_video(video_id)
+        try:
+            meta = next(records)
+        except (FileNotFoundError, ValueError, StopIteration):
+            continue
+        if meta.get("status", "ok") != "ok":
+            records.close()
+            continue
+        try:
+            yield video_id, meta, records
+        finally:
+            records.close()
+
+
+# Функция для массового экспорта видео из хранилища в поток out (бинарный)
+def write_bulk(out, fmt="jsonl", video_ids=None):
+    """Возвращает число выгруженных видео.
+
+    jsonl - один файл, в каждой строке есть video_id; srt и vtt - zip-архив
+    с файлом <video_id>.<расширение> на видео. Архив пишется последовательно,
+    поэтому out может быть сокетом или stdout без перемотки.
+    video_ids=None - все видео хранилища со статусом ok.
+    """
+    _check_format(fmt)
+    count = 0
+    if fmt == "jsonl":
+        for video_id, meta, records in _iter_exportable(video_ids):
+            for chunk in iter_chunks(iter_jsonl(records, video_id)):
+                out.write(chunk)
+            count += 1
+        out.flush()
+        return count
+
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for video_id, meta, records in _iter_exportable(video_ids):
+            name = f"{video_id}.{FORMATS[fmt]['extension']}"
+            with archive.open(name, "w", force_zip64=True) as entry:
+                for chunk in iter_chunks(WRITERS[fmt](records, video_id)):
+                    entry.write(chunk)
+            count += 1
+    out.flush()
+    return count
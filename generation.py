@@ -0,0 +1,195 @@
+"""Генерация материалов по референсу через Claude.
+
+Все артефакты (аннотации, сценарий, тексты превью, краткое содержание) получают
+один и тот же контекст референса - транскрипцию, синопсис и текст с превью.
+Контекст передаётся первым блоком system с пометкой cache_control, поэтому
+Claude кеширует его один раз, а остальные запросы читают из кеша.
+Функции модуля не обращаются к Streamlit и могут работать в фоновых потоках.
+"""
+import os
+import re
+
+import resources
+from anthropic_pool import estimate_tokens
+from deadline import Deadline
+
+# Сколько остальные запросы ждут, пока первый запишет контекст в кеш (секунды)
+PRIME_TIMEOUT = 30
+
+# Лимит времени на операцию по умолчанию и минимальное время на одну попытку генерации
+DEFAULT_DEADLINE = 600
+MIN_ATTEMPT_TIME = 30
+
+# Артефакты пакета: файл промпта и поля, которые он заполняет
+ARTIFACTS = {
+    "annotation": {
+        "prompt": "prompt_annotation.txt",
+        "fields": ["annotation_orig", "annotation_red"],
+        "title": "Аннотации",
+    },
+    "scenario": {
+        "prompt": "prompt_scenario.txt",
+        "fields": ["scenario"],
+        "title": "Сценарий",
+    },
+    "thumbnail_texts": {
+        "prompt": "prompt_generate_thumbnail_texts.txt",
+        "fields": ["thumbnail_texts"],
+        "title": "Тексты для превью",
+    },
+    "summary": {
+        "prompt": "prompt_summary.txt",
+        "fields": ["summary"],
+        "title": "Краткое содержание",
+    },
+    "comment": {
+        "prompt": "prompt_comment_on_video.txt",
+        "fields": ["video_comment"],
+        "title": "Комментарий к видео",
+    },
+}
+
+
+# Функция для выбора файла промпта с учетом языка (ru_prompts/prompt_ru_*.txt)
+def get_prompt_filename(filename, language="en"):
+    if language == "ru":
+        return os.path.join("ru_prompts", "prompt_ru_" + filename[len("prompt_"):])
+    return filename
+
+
+# Функция для сборки общего контекста референса
+def build_context(transcript, synopsis="", thumbnail_text="", title=""):
+    """Возвращает блоки system с контекстом, помеченные для кеширования Claude"""
+    parts = []
+    if title:
+        parts.append(f"Video title:\n{title}")
+    if thumbnail_text:
+        parts.append(f"Thumbnail reference text:\n{thumbnail_text}")
+    if synopsis:
+        parts.append(f"Story synopsis:\n{synopsis}")
+    parts.append(f"Video transcript:\n{transcript}")
+    return [
+        {
+            "type": "text",
+            "text": "\n\n".join(parts),
+            "cache_control": {"type": "ephemeral"},
+        }
+    ]
+
+
+# Функция для разделения ответа на аннотацию референса и изменённую
+def split_annotation(text):
+    match = re.search(r'^.*(?:VERSION|ВАРИАНТ)\s*#?\s*2.*$', text, flags=re.IGNORECASE | re.MULTILINE)
+    if not match:
+        return text.strip(), ""
+    first = text[:match.start()]
+    # Убираем заголовок первого варианта, если модель его повторила
+    first = re.sub(r'^.*(?:VERSION|ВАРИАНТ)\s*#?\s*1.*$', '', first, flags=re.IGNORECASE | re.MULTILINE)
+    return first.strip(" \n*#-"), text[match.end():].strip(" \n*#-")
+
+
+# Функция для запроса к Claude в потоковом режиме
+def generate_text(pool, model, max_tokens, system, user_content, temperature=0.7, on_start=None, deadline=None):
+    """Возвращает текст ответа. on_start вызывается при первом событии потока.
+
+    Запрос уходит через наименее загруженный ключ пула (anthropic_pool.py).
+    Таймаут запроса ограничен дедлайном, а отмена закрывает поток ответа,
+    прерывая генерацию на стороне клиента.
+    """
+    deadline = deadline or Deadline(DEFAULT_DEADLINE)
+    tokens = estimate_tokens(system, user_content) + max_tokens
+    with pool.lease(deadline, tokens) as lease:
+        # Повторы выполняет with_retries - встроенные повторы SDK не учитывают дедлайн
+        client = lease.client.with_options(max_retries=0)
+        with client.messages.stream(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system,
+            messages=[
+                {
+                    "role": "user",
+                    "content": user_content
+                }
+            ],
+            timeout=deadline.timeout(what="запрос к Claude")
+        ) as stream:
+            lease.update(stream.response.headers)
+            remove_callback = deadline.on_cancel(stream.response.close)
+            try:
+                for _event in stream:
+                    deadline.check("генерация текста")
+                    if on_start is not None:
+                        on_start()
+                        on_start = None
+            except Exception:
+                # Поток закрыт кнопкой отмены - сообщаем именно об отмене
+                deadline.check("генерация текста")
+                raise
+            finally:
+                remove_callback()
+            return stream.get_final_text()
+
+
+# Функция для повторных попыток при превышении лимитов API
+def with_retries(func, max_retries=5, base_delay=10, on_retry=None, deadline=None, pool=None):
+    """Повторяет func с экспоненциальной паузой, пока позволяет дедлайн.
+
+    Если после 429 в пуле есть ключ, который не отдыхает, запрос сразу
+    повторяется через него - без паузы и без траты попытки.
+    """
+    import anthropic
+
+    deadline = deadline or Deadline(DEFAULT_DEADLINE)
+    reroutes = 0
+    for attempt in range(max_retries):
+        if attempt > 0:
+            wait_time = base_delay * (2 ** (attempt - 1))  # 10, 20, 40, 80 секунд
+            # Если после паузы не останется времени на попытку - сразу выходим
+            what = f"попытка {attempt + 1}/{max_retries} через {wait_time} с"
+            deadline.require(wait_time + MIN_ATTEMPT_TIME, what)
+            if on_retry is not None:
+                on_retry(attempt + 1, max_retries, wait_time)
+            deadline.sleep(wait_time, what=what)
+        while True:
+            try:
+                return func()
+            except anthropic.RateLimitError:
+                if pool is not None and reroutes < len(pool) and pool.has_headroom():
+                    reroutes += 1
+                    continue
+                if attempt == max_retries - 1:
+                    raise
+            except (anthropic.InternalServerError, anthropic.APITimeoutError):
+                if attempt == max_retries - 1:
+                    raise
+            break
+
+
+# Функция для создания синопсиса (оригинального или изменённого)
+def create_synopsis(pool, model, max_tokens, prompt_text, content, deadline=None, on_retry=None):
+    """Возвращает текст синопсиса; ошибки API и дедлайна пробрасываются"""
+    return with_retries(
+        lambda: generate_text(pool, model, max_tokens, prompt_text, content, deadline=deadline),
+        on_retry=on_retry,
+        deadline=deadline,
+        pool=pool
+    )
+
+
+# Функция для генерации одного артефакта
+def generate_artifact(name, pool, model, max_tokens, context, language="en", on_start=None, deadline=None):
+    """Возвращает словарь {поле: текст} для артефакта name"""
+    deadline = deadline or Deadline(DEFAULT_DEADLINE)
+    artifact = ARTIFACTS[name]
+    prompt_text = resources.load_prompt(get_prompt_filename(artifact["prompt"], language))
+
+    result = with_retries(
+        lambda: generate_text(pool, model, max_tokens, context, prompt_text, on_start=on_start, deadline=deadline),
+        deadline=deadline,
+        pool=pool
+    )
+    if name == "annotation":
+        annotation_orig, annotation_red = split_annotation(result)
+        return {"annotation_orig": annotation_orig, "annotation_red": annotation_red}
+    return {artifact["fields"][0]: result}
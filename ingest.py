@@ -0,0 +1,247 @@
+"""Массовая загрузка видео канала или плейлиста.
+
+Видео перечисляются постранично через playlistItems.list (для канала - плейлист
+загрузок), метаданные запрашиваются пачками по 50 ID через videos.list, а
+транскрипции собираются параллельно ограниченным пулом потоков с ротацией прокси.
+Каждое видео сразу записывается в хранилище (store.py), уже обработанные видео
+пропускаются, поэтому прерванный запуск продолжается с места остановки, а память
+не растет с размером канала.
+"""
+import re
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import resources
+import store
+import search_index
+import youtube_data
+from deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# Максимальный размер страницы playlistItems.list и пачки videos.list
+PAGE_SIZE = 50
+
+# Лимит времени на массовую загрузку по умолчанию (секунды)
+DEFAULT_INGEST_DEADLINE = 6 * 3600
+
+
+# Функция для разбора ссылки на канал или плейлист
+def parse_source(url):
+    """Возвращает (тип, значение): playlist / channel_id / handle / username, или None"""
+    if not url:
+        return None
+    url = url.strip()
+
+    match = re.search(r'[?&]list=([A-Za-z0-9_-]+)', url)
+    if match:
+        return "playlist", match.group(1)
+    match = re.search(r'youtube\.com/channel/(UC[A-Za-z0-9_-]{22})', url)
+    if match:
+        return "channel_id", match.group(1)
+    match = re.search(r'youtube\.com/@([A-Za-z0-9_.-]+)', url)
+    if match:
+        return "handle", match.group(1)
+    match = re.search(r'youtube\.com/(?:c|user)/([A-Za-z0-9_.-]+)', url)
+    if match:
+        return "username", match.group(1)
+
+    # Просто ID или @handle
+    if re.match(r'^UC[A-Za-z0-9_-]{22}$', url):
+        return "channel_id", url
+    if re.match(r'^(PL|UU|OL|FL|LL)[A-Za-z0-9_-]+$', url):
+        return "playlist", url
+    if url.startswith("@"):
+        return "handle", url[1:]
+    return None
+
+
+# Функция для поиска ID канала по @handle или старому имени через страницу канала
+def _lookup_channel_id(path, deadline):
+    session = resources.get_http_session(deadline)
+    response = session.get(f"https://www.youtube.com/{path}")
+    if response.status_code != 200:
+        return None
+    match = re.search(r'"(?:externalId|channelId)":"(UC[A-Za-z0-9_-]{22})"', response.text)
+    return match.group(1) if match else None
+
+
+# Функция для определения плейлиста загрузок канала
+def resolve_playlist(source, deadline=None):
+    """Возвращает (ID плейлиста, название источника)"""
+    kind, value = source
+    if kind == "playlist":
+        response = youtube_data.execute_with_keys(
+            lambda youtube: youtube.playlists().list(part="snippet", id=value),
+            deadline
+        )
+        items = response.get("items", [])
+        return value, items[0]["snippet"]["title"] if items else value
+
+    if kind == "username":
+        response = youtube_data.execute_with_keys(
+            lambda youtube: youtube.channels().list(part="snippet,contentDetails", forUsername=value),
+            deadline
+        )
+        if not response.get("items"):
+            # /c/ ссылки - это не имя пользователя, ищем ID по странице канала
+            channel_id = _lookup_channel_id(f"c/{value}", deadline)
+            if not channel_id:
+                raise ValueError(f"Канал не найден: {value}")
+            kind, value = "channel_id", channel_id
+    elif kind == "handle":
+        channel_id = _lookup_channel_id(f"@{value}", deadline)
+        if not channel_id:
+            raise ValueError(f"Канал не найден: @{value}")
+        kind, value = "channel_id", channel_id
+
+    if kind == "channel_id":
+        response = youtube_data.execute_with_keys(
+            lambda youtube: youtube.channels().list(part="snippet,contentDetails", id=value),
+            deadline
+        )
+    if not response.get("items"):
+        raise ValueError(f"Канал не найден: {value}")
+    channel = response["items"][0]
+    return channel["contentDetails"]["relatedPlaylists"]["uploads"], channel["snippet"]["title"]
+
+
+# Генератор страниц ID видео плейлиста (по 50 штук)
+def iter_playlist_pages(playlist_id, deadline=None):
+    page_token = None
+    while True:
+        response = youtube_data.execute_with_keys(
+            lambda youtube: youtube.playlistItems().list(
+                part="contentDetails",
+                playlistId=playlist_id,
+                maxResults=PAGE_SIZE,
+                pageToken=page_token
+            ),
+            deadline
+        )
+        video_ids = [item["contentDetails"]["videoId"] for item in response.get("items", [])]
+        if video_ids:
+            yield video_ids
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return
+
+
+# Функция для получения метаданных пачки видео (до 50 ID за один запрос)
+def fetch_videos_metadata(video_ids, deadline=None):
+    response = youtube_data.execute_with_keys(
+        lambda youtube: youtube.videos().list(
+            part="snippet,contentDetails,statistics",
+            id=",".join(video_ids),
+            maxResults=PAGE_SIZE
+        ),
+        deadline
+    )
+    metadata = {}
+    for item in response.get("items", []):
+        snippet = item["snippet"]
+        metadata[item["id"]] = {
+            "video_id": item["id"],
+            "title": snippet.get("title", ""),
+            "channel_title": snippet.get("channelTitle", ""),
+            "published_at": snippet.get("publishedAt", ""),
+            "duration": item.get("contentDetails", {}).get("duration", ""),
+            "views": int(item.get("statistics", {}).get("viewCount", 0) or 0),
+        }
+    return metadata
+
+
+# Функция для загрузки транскрипции одного видео и записи в хранилище
+def harvest_video(meta, deadline, proxy_pool):
+    try:
+        segments = youtube_data.fetch_transcript_with_rotation(meta["video_id"], deadline, proxy_pool)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        # Ошибка сети/блокировка - видео останется необработанным до следующего запуска
+        store.save_video(dict(meta, status="error", error=str(e)[:200]))
+        return "error"
+    if segments is None:
+        store.save_video(dict(meta, status="unavailable"))
+        return "unavailable"
+    store.save_video(dict(meta, status="ok", segment_count=len(segments)), segments)
+    # Ошибка индекса (например, "database is locked") не должна останавливать загрузку канала:
+    # видео уже сохранено, а индекс можно достроить кнопкой "Проиндексировать загруженные видео"
+    try:
+        search_index.index_reference(
+            meta["video_id"],
+            title=meta.get("title"),
+            transcript="\n".join(segment["text"] for segment in segments)
+        )
+    except Exception as e:
+        logger.warning("Ошибка индексации %s: %s", meta["video_id"], e)
+    return "ok"
+
+
+# Функция для массовой загрузки канала или плейлиста
+def run_ingest(source_url, workers=8, use_proxies=True, limit=None, deadline=None, on_progress=None):
+    """Возвращает статистику загрузки.
+
+    on_progress(stats, meta) вызывается из фонового потока после каждого видео.
+    """
+    deadline = deadline or Deadline(DEFAULT_INGEST_DEADLINE)
+    source = parse_source(source_url)
+    if source is None:
+        raise ValueError("Некорректная ссылка на канал или плейлист")
+
+    playlist_id, source_title = resolve_playlist(source, deadline)
+    proxy_pool = youtube_data.get_proxy_pool() if use_proxies else None
+    stats = {
+        "source": source_title,
+        "playlist_id": playlist_id,
+        "listed": 0,
+        "skipped": 0,
+        "ok": 0,
+        "unavailable": 0,
+        "error": 0,
+        "started": time.time(),
+    }
+
+    def on_done(future, meta):
+        status = future.result()
+        stats[status] += 1
+        if on_progress is not None:
+            on_progress(stats, dict(meta, status=status))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest") as executor:
+        in_flight = {}
+        seen = set()  # Плейлист может содержать одно видео несколько раз
+        for page in iter_playlist_pages(playlist_id, deadline):
+            if limit:
+                page = page[:max(0, limit - stats["listed"])]
+            stats["listed"] += len(page)
+
+            # Уже обработанные и уже поставленные в этом запуске видео пропускаем без запросов к API
+            todo = []
+            for video_id in page:
+                if video_id not in seen and not store.is_done(video_id):
+                    todo.append(video_id)
+                seen.add(video_id)
+            stats["skipped"] += len(page) - len(todo)
+            if todo:
+                metadata = fetch_videos_metadata(todo, deadline)
+                for video_id in todo:
+                    meta = metadata.get(video_id, {"video_id": video_id, "title": ""})
+                    meta["source"] = playlist_id
+
+                    # Не больше двух задач на поток в очереди - память не растет
+                    while len(in_flight) >= workers * 2:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            on_done(future, in_flight.pop(future))
+                    in_flight[executor.submit(harvest_video, meta, deadline, proxy_pool)] = meta
+
+            if limit and stats["listed"] >= limit:
+                break
+
+        for future in list(in_flight):
+            on_done(future, in_flight.pop(future))
+
+    stats["seconds"] = round(time.time() - stats["started"], 1)
+    return stats
@@ -0,0 +1,326 @@
+"""Задачи пайплайна: данные референса, синопсис, материалы, загрузка канала, ответы на комментарии.
+
+Задача - функция (params, deadline, report): параметры и результат - JSON, поэтому
+одна и та же задача выполняется и в фоновом потоке страницы, и в рабочем процессе
+HTTP API (api_server.py). report(event) сообщает о ходе выполнения: шаги, повторы,
+прогресс загрузки.
+Если задан TOPIC_MAKER_API_URL, call() и submit() отправляют задачи в HTTP API,
+а страница Streamlit только показывает их ход.
+"""
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import resources
+import anthropic_pool
+import api_client
+import comments
+import generation
+import ingest
+import reference
+from deadline import Deadline
+
+# Пулы потоков по типам задач: долгие загрузки канала и ответы на комментарии
+# не занимают потоки коротких шагов (данные референса, синопсис, материалы)
+JOB_WORKERS = {
+    "reference": int(os.environ.get("REFERENCE_WORKERS", "8")),
+    "synopsis": int(os.environ.get("SYNOPSIS_WORKERS", "8")),
+    "artifact": int(os.environ.get("ARTIFACT_WORKERS", "8")),
+    "ingest": int(os.environ.get("INGEST_JOB_WORKERS", "2")),
+    "replies": int(os.environ.get("REPLIES_JOB_WORKERS", "4")),
+}
+_executors = {
+    kind: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{kind}")
+    for kind, workers in JOB_WORKERS.items()
+}
+
+
+# Функция для получения пула ключей Claude
+def _get_pool():
+    pool = anthropic_pool.get_pool()
+    if pool is None:
+        raise ValueError("API ключ Anthropic не найден в секретах")
+    return pool
+
+
+# Функция, превращающая сообщения о повторах в события задачи
+def _retry_reporter(report):
+    return lambda attempt, max_retries, wait_time: report(
+        {"type": "retry", "attempt": attempt, "max_retries": max_retries, "wait": wait_time}
+    )
+
+
+# Задача: заголовок, текст с превью и транскрипция видео
+def run_reference(params, deadline, report):
+    """params: video_id"""
+    video_id = params["video_id"]
+
+    title = reference.get_video_title(video_id, deadline) or ""
+    report({"type": "step", "step": "title", "value": title})
+
+    thumbnail_text = reference.get_thumbnail_text(video_id, deadline) or ""
+    report({"type": "step", "step": "thumbnail_text"})
+
+    transcript, transcript_with_timestamps = reference.get_video_transcript(video_id, title, deadline)
+    report({"type": "step", "step": "transcript"})
+
+    return {
+        "video_id": video_id,
+        "title": title,
+        "thumbnail_text": thumbnail_text,
+        "transcript": transcript or "",
+        "transcript_with_timestamps": transcript_with_timestamps or "",
+    }
+
+
+# Задача: синопсис референса (orig) или изменённый синопсис (red)
+def run_synopsis(params, deadline, report):
+    """params: kind, content, model, max_tokens, video_id, title, reuse, reuse_threshold (0..1).
+
+    Если reuse включен и похожая работа уже есть в индексе, синопсис референса
+    берется из индекса без запроса к Claude; reused_from описывает найденный референс.
+    """
+    kind = params.get("kind", "orig")
+    content = params["content"]
+    video_id = params.get("video_id")
+    reuse = params.get("reuse", True)
+
+    if kind == "orig":
+        if reuse:
+            match = reference.find_reusable_synopsis(content, params.get("reuse_threshold", 0.9))
+            if match:
+                return {
+                    "synopsis": match["synopsis_orig"],
+                    "reused_from": {
+                        "video_id": match["video_id"],
+                        "title": match["title"],
+                        "similarity": match["similarity"],
+                    },
+                }
+        prompt_file = "prompt_synopsis_orig.txt"
+    else:
+        # Изменённый синопсис - новая переработка при каждом запросе, из индекса не берется
+        prompt_file = "prompt_synopsis_red.txt"
+
+    prompt_text = resources.load_prompt(prompt_file)
+    synopsis = generation.create_synopsis(
+        _get_pool(),
+        params["model"],
+        params["max_tokens"],
+        prompt_text,
+        content,
+        deadline=deadline,
+        on_retry=_retry_reporter(report)
+    )
+
+    if kind == "orig":
+        reference.update_index(video_id, title=params.get("title"), transcript=content, synopsis_orig=synopsis)
+    else:
+        reference.update_index(video_id, synopsis_orig=content, synopsis_red=synopsis)
+    return {"synopsis": synopsis, "reused_from": None}
+
+
+# Задача: один артефакт пакета материалов на общем контексте референса
+def run_artifact(params, deadline, report):
+    """params: name, transcript, synopsis, thumbnail_text, title, model, max_tokens, language"""
+    context = generation.build_context(
+        params["transcript"],
+        synopsis=params.get("synopsis", ""),
+        thumbnail_text=params.get("thumbnail_text", ""),
+        title=params.get("title", "")
+    )
+    return generation.generate_artifact(
+        params["name"],
+        _get_pool(),
+        params["model"],
+        params["max_tokens"],
+        context,
+        language=params.get("language", "en"),
+        on_start=lambda: report({"type": "primed"}),
+        deadline=deadline
+    )
+
+
+# Задача: массовая загрузка канала или плейлиста
+def run_ingest(params, deadline, report):
+    """params: source_url, workers, use_proxies, limit"""
+    return ingest.run_ingest(
+        params["source_url"],
+        workers=params.get("workers", 8),
+        use_proxies=params.get("use_proxies", True),
+        limit=params.get("limit"),
+        deadline=deadline,
+        on_progress=lambda stats, meta: report({
+            "type": "progress",
+            "stats": dict(stats),
+            "video": {"video_id": meta["video_id"], "title": meta.get("title", ""), "status": meta["status"]},
+        })
+    )
+
+
+# Задача: массовые ответы на комментарии к видео
+def run_replies(params, deadline, report):
+    """params: video_id, transcript, model, max_tokens, language, max_comments, batch_size, concurrency"""
+    return comments.run_reply_pipeline(
+        params["video_id"],
+        params["transcript"],
+        _get_pool(),
+        params["model"],
+        params["max_tokens"],
+        language=params.get("language", "en"),
+        max_comments=params.get("max_comments", 200),
+        batch_size=params.get("batch_size", 20),
+        concurrency=params.get("concurrency", 4),
+        deadline=deadline,
+        on_replies=lambda records: report({"type": "replies", "records": records})
+    )
+
+
+JOBS = {
+    "reference": run_reference,
+    "synopsis": run_synopsis,
+    "artifact": run_artifact,
+    "ingest": run_ingest,
+    "replies": run_replies,
+}
+
+
+# Функция для выполнения задачи в текущем процессе
+def run_job(kind, params, deadline, report=None):
+    if kind not in JOBS:
+        raise ValueError(f"Неизвестная задача: {kind}")
+    return JOBS[kind](params, deadline, report or (lambda event: None))
+
+
+# Функция для выполнения задачи: через HTTP API, если он задан, иначе в текущем процессе
+def call(kind, params, deadline, on_event=None):
+    if api_client.is_enabled():
+        return api_client.run(kind, params, deadline, on_event)
+    return run_job(kind, params, deadline, on_event)
+
+
+# Функция для запуска задачи в фоновом потоке пула ее типа; возвращает Future
+def submit(kind, params, deadline, on_event=None):
+    if kind not in _executors:
+        raise ValueError(f"Неизвестная задача: {kind}")
+    return _executors[kind].submit(call, kind, params, deadline, on_event)
+
+
+# Функция для передачи результата одного Future в другой
+def _chain(source, target):
+    def copy(future):
+        if future.cancelled():
+            target.cancel()
+        elif future.exception() is not None:
+            target.set_exception(future.exception())
+        else:
+            target.set_result(future.result())
+    source.add_done_callback(copy)
+
+
+# Функция для параллельного запуска артефактов на общем контексте
+def start_artifacts(names, params, deadline):
+    """Возвращает словарь {имя артефакта: Future}.
+
+    Первый артефакт стартует сразу; остальные - как только Claude начал отвечать
+    на первый (контекст уже в кеше), первый завершился или прошло PRIME_TIMEOUT,
+    поэтому общее время близко к времени самого долгого артефакта.
+    Ожидающие артефакты не занимают потоки пула - они отправляются при событии.
+    """
+    names = list(names)
+    futures = {name: Future() for name in names[1:]}
+    lock = threading.Lock()
+    started = []
+
+    def start_rest():
+        with lock:
+            if started:
+                return
+            started.append(True)
+        timer.cancel()
+        for name in names[1:]:
+            try:
+                _chain(submit("artifact", dict(params, name=name), deadline), futures[name])
+            except Exception as e:
+                futures[name].set_exception(e)
+
+    def on_event(event):
+        if event.get("type") == "primed":
+            start_rest()
+
+    timer = threading.Timer(min(generation.PRIME_TIMEOUT, deadline.remaining()), start_rest)
+    timer.daemon = True
+    if names:
+        futures[names[0]] = submit("artifact", dict(params, name=names[0]), deadline, on_event)
+        futures[names[0]].add_done_callback(lambda future: start_rest())
+        timer.start()
+    return {name: futures[name] for name in names}
+
+
+# Функция инициализации рабочего процесса HTTP API
+def init_worker(cooldowns=None):
+    """cooldowns - общий словарь отдыха ключей Anthropic (см. anthropic_pool.share_cooldowns)"""
+    os.chdir(resources.APP_DIR)
+    if cooldowns is not None:
+        anthropic_pool.share_cooldowns(cooldowns)
+    resources.start_warmup()
+
+
+# Функция для выполнения задачи в рабочем процессе HTTP API
+def execute(job_id, kind, params, expires_at, cancel_event, events):
+    """Возвращает {"ok": True, "result": ...} или {"ok": False, "error_type", "error"}.
+
+    Исключения не пробрасываются: не все ошибки SDK можно передать между процессами.
+    cancel_event и events - объекты multiprocessing.Manager, общие с сервером.
+    """
+    if cancel_event.is_set():
+        return {"ok": False, "error_type": "Cancelled", "error": "Задача отменена до запуска"}
+    deadline = Deadline(max(0.0, expires_at - time.time()), cancel_event=cancel_event)
+    deadline.expires_at = expires_at
+
+    def report(event):
+        events.put((job_id, event))
+
+    report({"type": "started", "pid": os.getpid()})
+
+    # Отмена приходит через общий Event - прерываем текущие запросы задачи
+    finished = threading.Event()
+
+    def watch_cancel():
+        while not finished.is_set():
+            if cancel_event.wait(0.5):
+                deadline.cancel()
+                return
+
+    threading.Thread(target=watch_cancel, name=f"cancel-{job_id}", daemon=True).start()
+    try:
+        return {"ok": True, "result": run_job(kind, params, deadline, report)}
+    except Exception as e:
+        return {"ok": False, "error_type": type(e).__name__, "error": str(e)}
+    finally:
+        finished.set()
+
+
+# Функция рабочего процесса HTTP API: выполняет задачи из своей очереди в потоках
+def worker_loop(tasks, events, threads, cooldowns=None):
+    """Задачи почти все время ждут ответов Claude и YouTube, поэтому процесс выполняет
+    до threads задач одновременно; больше сервер ему не отправляет. Итог задачи
+    отправляется событием finished; None в очереди - остановка процесса.
+    """
+    init_worker(cooldowns)
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="api-job")
+
+    def run(task):
+        try:
+            outcome = execute(*task, events)
+        except Exception as e:
+            outcome = {"ok": False, "error_type": type(e).__name__, "error": str(e)}
+        events.put((task[0], {"type": "finished", "outcome": outcome}))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        executor.submit(run, task)
+    executor.shutdown(wait=False, cancel_futures=True)
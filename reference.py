@@ -0,0 +1,184 @@
+"""Данные референса: заголовок, текст с превью и транскрипция видео.
+
+Функции модуля не обращаются к Streamlit: их вызывают задачи (jobs.py) как в
+процессе страницы, так и в рабочих процессах HTTP API (api_server.py).
+"""
+import io
+import base64
+import logging
+
+import resources
+import anthropic_pool
+import generation
+import search_index
+import store
+import youtube_data
+from deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+# Функция для получения заголовка видео
+def get_video_title(video_id, deadline=None):
+    from googleapiclient.errors import HttpError
+    
+    # Получение API ключей из секретов
+    api_keys = resources.get_youtube_api_keys()
+    
+    if not api_keys:
+        return f"Видео ID: {video_id}"
+    
+    # Пробуем каждый ключ по очереди
+    for api_key in api_keys:
+        try:
+            youtube = resources.get_youtube_client(api_key)
+            request = youtube.videos().list(
+                part="snippet",
+                id=video_id
+            )
+            response = resources.execute_youtube(request, deadline)
+            
+            if response['items']:
+                return response['items'][0]['snippet']['title']
+            else:
+                return "Видео не найдено"
+        except HttpError as e:
+            if "quota" in str(e).lower():
+                continue  # Пробуем следующий ключ, если превышена квота
+            else:
+                return f"Ошибка: {str(e)[:100]}"
+    
+    return "Все API ключи исчерпали квоту"
+
+
+# Функция для получения транскрипции видео
+def get_video_transcript(video_id, title="", deadline=None):
+    try:
+        # Сегменты (text, start, duration) сохраняем в хранилище вместе с заголовком
+        segments = youtube_data.fetch_transcript_segments(video_id, deadline)
+        
+        # Собираем текст транскрипции в двух форматах
+        if segments:
+            store.save_video(
+                {"video_id": video_id, "title": title, "segment_count": len(segments)},
+                segments
+            )
+            full_text, full_text_with_timestamps = youtube_data.format_transcript(segments)
+            update_index(video_id, title=title, transcript=full_text)
+            return full_text, full_text_with_timestamps
+        else:
+            return "Транскрипция недоступна для этого видео", "Транскрипция недоступна для этого видео"
+    
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        # Обработка различных типов ошибок
+        error_str = str(e)
+        if "no element found" in error_str.lower() or "xml" in error_str.lower():
+            return "Транскрипция недоступна для этого видео", "Транскрипция недоступна для этого видео"
+        else:
+            error_msg = f"Не удалось получить транскрипцию: {error_str[:200]}"
+            return error_msg, error_msg
+
+
+# Функция для получения текста с превью через Claude API
+def get_thumbnail_text(video_id, deadline=None):
+    deadline = deadline or Deadline(generation.DEFAULT_DEADLINE)
+    try:
+        from PIL import Image
+        session = resources.get_http_session(deadline)
+        
+        # Получаем URL превью
+        thumbnail_url = f"https://i.ytimg.com/vi/{video_id}/maxresdefault.jpg"
+        response = session.get(thumbnail_url)
+        
+        # Если maxresdefault не доступен, пробуем hqdefault
+        if response.status_code != 200:
+            thumbnail_url = f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+            response = session.get(thumbnail_url)
+            
+        if response.status_code != 200:
+            return "Не удалось получить превью видео"
+        
+        # Открываем изображение
+        image = Image.open(io.BytesIO(response.content))
+        
+        # Конвертируем изображение в base64
+        buffered = io.BytesIO()
+        image.save(buffered, format="JPEG")
+        img_base64 = base64.b64encode(buffered.getvalue()).decode()
+        
+        # Загружаем промпт для обработки изображения
+        try:
+            prompt_text = resources.load_prompt("prompt_get_thumbnail_text.txt")
+        except FileNotFoundError:
+            prompt_text = "Опишите текст, который вы видите на этом изображении превью YouTube видео. Выпишите весь текст точно как он написан."
+        
+        # Берем пул ключей Claude
+        pool = anthropic_pool.get_pool()
+        if pool is None:
+            return "API ключ Anthropic не найден. Задайте ANTHROPIC_API_KEY или ANTHROPIC_API_KEY_1..N"
+        
+        # Проверяем формат ключей
+        if not all(api_key.startswith("sk-") for api_key in pool.api_keys):
+            return f"Неверный формат API ключа Anthropic (должен начинаться с 'sk-')"
+        
+        # Отправляем запрос к Claude через наименее загруженный ключ
+        with pool.lease(deadline) as lease:
+            raw_response = lease.client.messages.with_raw_response.create(
+                model="claude-3-haiku-20240307",  # Используем Haiku для обработки изображений
+                max_tokens=1000,
+                timeout=deadline.timeout(what="распознавание превью"),
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": prompt_text
+                            },
+                            {
+                                "type": "image",
+                                "source": {
+                                    "type": "base64",
+                                    "media_type": "image/jpeg",
+                                    "data": img_base64
+                                }
+                            }
+                        ]
+                    }
+                ]
+            )
+            lease.update(raw_response.headers)
+            message = raw_response.parse()
+        
+        return message.content[0].text
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        # Более подробная информация об ошибке
+        error_msg = f"Ошибка при обработке превью: {str(e)}"
+        if "api_key" in str(e).lower():
+            error_msg = "Проблема с API ключом Anthropic. Проверьте правильность ключа в секретах."
+        return error_msg
+
+
+# Функция для записи референса в локальный индекс (ошибка индекса не мешает работе)
+def update_index(video_id, **fields):
+    if not video_id:
+        return
+    try:
+        search_index.index_reference(video_id, **fields)
+    except Exception as e:
+        logger.warning("Ошибка индексации %s: %s", video_id, e)
+
+
+# Функция для поиска готового синопсиса похожего референса в индексе
+def find_reusable_synopsis(transcript, threshold):
+    try:
+        matches = search_index.find_similar(transcript, threshold=threshold, limit=1, with_synopsis=True)
+    except Exception as e:
+        logger.warning("Ошибка поиска похожих референсов: %s", e)
+        return None
+    return matches[0] if matches else None
+
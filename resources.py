@@ -0,0 +1,345 @@
+"""Общие ресурсы приложения: клиенты API, промпты и прогрев после перезапуска.
+
+Модуль импортируется один раз на процесс, поэтому всё, что здесь закешировано,
+переживает перезапуски скрипта Streamlit и разделяется между сессиями.
+Тяжёлые библиотеки (anthropic, googleapiclient, youtube_transcript_api, PIL)
+импортируются лениво — первая отрисовка страницы их не ждёт.
+"""
+import os
+import glob
+import json
+import time
+import queue
+import threading
+import logging
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Корень приложения - относительно него ищем промпты
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Каталог для сохраняемых результатов (ответы на комментарии, транскрипции и т.п.)
+DATA_DIR = os.environ.get("TOPIC_MAKER_DATA_DIR", os.path.join(APP_DIR, "data"))
+
+# Таймауты по умолчанию для HTTP-запросов (секунды)
+HTTP_TIMEOUT = 30
+YOUTUBE_TIMEOUT = 30
+
+# Сколько соединений с YouTube Data API открывать при прогреве
+YOUTUBE_WARMUP_CONNECTIONS = 4
+
+# Адреса, к которым заранее открываем TLS-соединения при прогреве
+WARMUP_URLS = [
+    "https://i.ytimg.com/",
+    "https://www.youtube.com/",
+]
+
+_lock = threading.Lock()
+_prompts = {}
+_anthropic_clients = {}
+_anthropic_http = None
+_http_session = None
+_youtube_doc = None
+_youtube_clients = {}
+_youtube_http_pool = queue.LifoQueue()  # Свободные httplib2.Http с открытыми соединениями
+
+_ready = threading.Event()
+_ready_checks = []  # Дополнительные условия готовности: функции без аргументов -> bool
+_warmup_thread = None
+_warmup_info = {"started": None, "finished": None, "error": None}
+
+
+# Функция для получения секрета: сначала переменные окружения, затем st.secrets
+def get_secret(name, default=None):
+    value = os.environ.get(name)
+    if value:
+        return value
+    try:
+        import streamlit as st
+        if name in st.secrets:
+            return str(st.secrets[name])
+    except Exception:
+        pass
+    return default
+
+
+# Функция для получения списка ключей YouTube API (YOUTUBE_API_KEY_1..N)
+def get_youtube_api_keys():
+    api_keys = []
+    i = 1
+    while True:
+        key = get_secret(f"YOUTUBE_API_KEY_{i}")
+        if not key:
+            break
+        api_keys.append(key)
+        i += 1
+    return api_keys
+
+
+# Функция для получения списка ключей Anthropic API (ANTHROPIC_API_KEY_1..N или один ANTHROPIC_API_KEY)
+def get_anthropic_api_keys():
+    api_keys = []
+    i = 1
+    while True:
+        key = get_secret(f"ANTHROPIC_API_KEY_{i}")
+        if not key:
+            break
+        api_keys.append(key)
+        i += 1
+    if not api_keys:
+        key = get_secret("ANTHROPIC_API_KEY")
+        if key:
+            api_keys.append(key)
+    return api_keys
+
+
+# Функция для загрузки промпта с кешированием в памяти процесса
+def load_prompt(filename):
+    """Возвращает текст промпта. Бросает FileNotFoundError, если файла нет."""
+    path = filename if os.path.isabs(filename) else os.path.join(APP_DIR, filename)
+    text = _prompts.get(path)
+    if text is None:
+        with open(path, "r", encoding="utf-8") as file:
+            text = file.read()
+        _prompts[path] = text
+    return text
+
+
+class _DeadlineSession(requests.Session):
+    """Сессия на общем пуле соединений, ограничивающая таймаут каждого запроса дедлайном"""
+
+    def __init__(self, adapter, deadline):
+        super().__init__()
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.deadline = deadline
+
+    def request(self, method, url, **kwargs):
+        kwargs["timeout"] = self.deadline.timeout(kwargs.get("timeout") or HTTP_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+# Функция для получения HTTP-сессии с общим пулом соединений.
+# С дедлайном возвращает сессию, у которой таймаут запросов не выходит за дедлайн.
+def get_http_session(deadline=None):
+    global _http_session
+    if _http_session is None:
+        with _lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=10, pool_maxsize=32)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http_session = session
+    if deadline is not None:
+        return _DeadlineSession(_http_session.get_adapter("https://"), deadline)
+    return _http_session
+
+
+# Функция для получения клиента Claude (один клиент на ключ, общий пул соединений)
+def get_anthropic_client(api_key):
+    global _anthropic_http
+    client = _anthropic_clients.get(api_key)
+    if client is None:
+        import anthropic
+        import httpx
+        with _lock:
+            if _anthropic_http is None:
+                _anthropic_http = httpx.Client(
+                    timeout=httpx.Timeout(600, connect=10),
+                    limits=httpx.Limits(max_connections=64, max_keepalive_connections=16),
+                )
+            client = _anthropic_clients.get(api_key)
+            if client is None:
+                client = anthropic.Anthropic(api_key=api_key, http_client=_anthropic_http)
+                _anthropic_clients[api_key] = client
+    return client
+
+
+# Функция для получения discovery-документа YouTube API (из пакета, без сети)
+def _get_youtube_discovery_doc():
+    global _youtube_doc
+    if _youtube_doc is None:
+        from googleapiclient import discovery_cache
+        with _lock:
+            if _youtube_doc is None:
+                _youtube_doc = json.loads(discovery_cache.get_static_doc("youtube", "v3"))
+    return _youtube_doc
+
+
+# Функция для получения клиента YouTube API (один клиент на ключ на процесс).
+# Дорогой разбор discovery-документа выполняется один раз; запросы клиента
+# выполняются через execute_youtube на соединениях из общего пула.
+def get_youtube_client(api_key):
+    youtube = _youtube_clients.get(api_key)
+    if youtube is None:
+        import httplib2
+        from googleapiclient.discovery import build_from_document
+        doc = _get_youtube_discovery_doc()
+        with _lock:
+            youtube = _youtube_clients.get(api_key)
+            if youtube is None:
+                youtube = build_from_document(
+                    doc,
+                    developerKey=api_key,
+                    http=httplib2.Http(timeout=YOUTUBE_TIMEOUT),
+                )
+                _youtube_clients[api_key] = youtube
+    return youtube
+
+
+# Функция для получения соединения с YouTube API из пула.
+# httplib2 не потокобезопасен, поэтому Http выдается одному потоку на время запроса,
+# а затем возвращается в пул вместе с открытым TLS-соединением.
+def _acquire_youtube_http():
+    try:
+        return _youtube_http_pool.get_nowait()
+    except queue.Empty:
+        import httplib2
+        return httplib2.Http(timeout=YOUTUBE_TIMEOUT)
+
+
+# Функция для выполнения запроса к YouTube API с учетом дедлайна
+def execute_youtube(request, deadline=None):
+    timeout = YOUTUBE_TIMEOUT
+    if deadline is not None:
+        timeout = deadline.timeout(YOUTUBE_TIMEOUT, what="запрос к YouTube API")
+    if timeout < YOUTUBE_TIMEOUT:
+        # До дедлайна меньше обычного таймаута - отдельное соединение с коротким таймаутом
+        import httplib2
+        return request.execute(http=httplib2.Http(timeout=max(timeout, 1)))
+    http = _acquire_youtube_http()
+    try:
+        return request.execute(http=http)
+    finally:
+        _youtube_http_pool.put(http)
+
+
+# Функция для открытия соединений с YouTube API заранее (соединения остаются в пуле)
+def _warm_up_youtube_connections():
+    root_url = _get_youtube_discovery_doc()["rootUrl"]
+    connections = [_acquire_youtube_http() for _ in range(YOUTUBE_WARMUP_CONNECTIONS)]
+    try:
+        for http in connections:
+            http.request(root_url, "HEAD")
+    except Exception as e:
+        logger.warning("Прогрев соединения с YouTube API не удался: %s", e)
+    finally:
+        for http in connections:
+            _youtube_http_pool.put(http)
+
+
+# Функция прогрева: импорты, промпты, клиенты и TLS-соединения
+def warm_up():
+    _warmup_info["started"] = time.time()
+    try:
+        # Тяжёлые импорты
+        import anthropic  # noqa: F401
+        import googleapiclient.discovery  # noqa: F401
+        import youtube_transcript_api  # noqa: F401
+        from PIL import Image  # noqa: F401
+
+        # Все промпты, включая русские версии
+        for path in glob.glob(os.path.join(APP_DIR, "prompt*.txt")) + glob.glob(os.path.join(APP_DIR, "ru_prompts", "*.txt")):
+            load_prompt(path)
+
+        # Discovery-документ, клиенты и соединения YouTube API
+        api_keys = get_youtube_api_keys()
+        for api_key in api_keys:
+            get_youtube_client(api_key)
+        if api_keys:
+            _warm_up_youtube_connections()
+
+        # Пулы соединений: превью/транскрипции и Claude
+        session = get_http_session()
+        for url in WARMUP_URLS:
+            try:
+                session.head(url, timeout=5)
+            except requests.RequestException as e:
+                logger.warning("Прогрев %s не удался: %s", url, e)
+
+        # Соединения общие для всех ключей - достаточно одного запроса
+        clients = [get_anthropic_client(api_key) for api_key in get_anthropic_api_keys()]
+        if clients:
+            try:
+                _anthropic_http.head(str(clients[0].base_url), timeout=5)
+            except Exception as e:
+                logger.warning("Прогрев соединения с Claude не удался: %s", e)
+    except Exception as e:
+        # Прогрев не должен ронять приложение - всё догрузится лениво
+        _warmup_info["error"] = str(e)
+        logger.exception("Ошибка прогрева")
+    finally:
+        _warmup_info["finished"] = time.time()
+        _ready.set()
+        logger.info("Прогрев завершён за %.1f с", _warmup_info["finished"] - _warmup_info["started"])
+
+
+# Функция для запуска прогрева в фоне (повторные вызовы ничего не делают)
+def start_warmup():
+    global _warmup_thread
+    with _lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+            _warmup_thread.start()
+
+
+# Функция для добавления условия готовности (например, что порт Streamlit уже слушается)
+def add_ready_check(check):
+    _ready_checks.append(check)
+
+
+def is_ready():
+    return _ready.is_set() and all(check() for check in _ready_checks)
+
+
+def wait_until_ready(timeout=None, interval=0.2):
+    started = time.time()
+    if not _ready.wait(timeout):
+        return False
+    while not all(check() for check in _ready_checks):
+        if timeout is not None and time.time() - started >= timeout:
+            return False
+        time.sleep(interval)
+    return True
+
+
+def get_warmup_info():
+    info = dict(_warmup_info)
+    info["ready"] = is_ready()
+    if info["started"] and info["finished"]:
+        info["seconds"] = round(info["finished"] - info["started"], 2)
+    return info
+
+
+class _ReadinessHandler(BaseHTTPRequestHandler):
+    """GET /ready - 200 после прогрева и остальных условий готовности, иначе 503. GET /health - всегда 200."""
+
+    def do_GET(self):
+        if self.path.startswith("/health"):
+            status = 200
+        elif self.path.startswith("/ready"):
+            status = 200 if is_ready() else 503
+        else:
+            status = 404
+        body = json.dumps(get_warmup_info()).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Функция для запуска HTTP-сервера проверки готовности в фоновом потоке
+def start_readiness_server(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), _ReadinessHandler)
+    thread = threading.Thread(target=server.serve_forever, name="readiness", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,268 @@
+"""Локальный индекс обработанных референсов: полнотекстовый поиск и поиск почти-дубликатов.
+
+Транскрипции и синопсисы хранятся в SQLite (data/index.sqlite3):
+- таблица FTS5 для поиска по ключевым словам;
+- MinHash-подпись транскрипции (128 хешей по шинглам из 5 слов) и LSH-корзины
+  (32 полосы по 4 хеша) для быстрого поиска похожих транскрипций.
+Кандидаты отбираются по совпадению хотя бы одной корзины (один запрос по индексу),
+а похожесть оценивается по доле совпавших хешей подписи.
+"""
+import os
+import re
+import time
+import random
+import struct
+import hashlib
+import sqlite3
+import threading
+import zlib
+
+import resources
+
+INDEX_PATH = os.path.join(resources.DATA_DIR, "index.sqlite3")
+
+# Параметры MinHash/LSH
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+# Хеши шинглов 32-битные, коэффициенты перестановок < 2^32: a * h + b помещается в uint64
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1)
+_PERMUTATIONS = [
+    (_rng.randrange(1, 1 << 32), _rng.randrange(0, 1 << 32))
+    for _ in range(NUM_PERM)
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    video_id TEXT PRIMARY KEY,
+    title TEXT,
+    transcript TEXT,
+    synopsis_orig TEXT,
+    synopsis_red TEXT,
+    minhash BLOB,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS lsh (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    video_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lsh_bucket ON lsh(band, bucket);
+CREATE INDEX IF NOT EXISTS lsh_video ON lsh(video_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS refs_fts USING fts5(
+    title, transcript, synopsis_orig, synopsis_red,
+    content='refs', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS refs_ai AFTER INSERT ON refs BEGIN
+    INSERT INTO refs_fts(rowid, title, transcript, synopsis_orig, synopsis_red)
+    VALUES (new.rowid, new.title, new.transcript, new.synopsis_orig, new.synopsis_red);
+END;
+CREATE TRIGGER IF NOT EXISTS refs_ad AFTER DELETE ON refs BEGIN
+    INSERT INTO refs_fts(refs_fts, rowid, title, transcript, synopsis_orig, synopsis_red)
+    VALUES ('delete', old.rowid, old.title, old.transcript, old.synopsis_orig, old.synopsis_red);
+END;
+CREATE TRIGGER IF NOT EXISTS refs_au AFTER UPDATE ON refs BEGIN
+    INSERT INTO refs_fts(refs_fts, rowid, title, transcript, synopsis_orig, synopsis_red)
+    VALUES ('delete', old.rowid, old.title, old.transcript, old.synopsis_orig, old.synopsis_red);
+    INSERT INTO refs_fts(rowid, title, transcript, synopsis_orig, synopsis_red)
+    VALUES (new.rowid, new.title, new.transcript, new.synopsis_orig, new.synopsis_red);
+END;
+"""
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+# Функция для получения соединения с индексом (одно на поток)
+def _connect():
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+        conn = sqlite3.connect(INDEX_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _schema_lock:
+            if not _schema_ready:
+                conn.executescript(SCHEMA)
+                _schema_ready = True
+        _local.conn = conn
+    return conn
+
+
+# Функция для разбиения текста на шинглы (последовательности из SHINGLE_SIZE слов)
+def _shingles(text):
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+# Функция для вычисления MinHash-подписи текста
+def minhash(text):
+    import numpy as np
+
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    a = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)
+    b = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)
+    # Матрица перестановок (NUM_PERM x число шинглов), минимум по каждой строке
+    values = (np.outer(a, hashes) + b[:, None]) % np.uint64(_MERSENNE_PRIME)
+    return [int(value) for value in values.min(axis=1)]
+
+
+def _pack(signature):
+    return struct.pack(f"<{NUM_PERM}Q", *signature)
+
+
+def _unpack(blob):
+    return struct.unpack(f"<{NUM_PERM}Q", blob)
+
+
+# Функция для вычисления LSH-корзин подписи: (номер полосы, хеш полосы)
+def _buckets(signature):
+    buckets = []
+    for band in range(BANDS):
+        chunk = struct.pack(f"<{ROWS}Q", *signature[band * ROWS:(band + 1) * ROWS])
+        bucket = int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), "big", signed=True)
+        buckets.append((band, bucket))
+    return buckets
+
+
+def similarity(signature_a, signature_b):
+    """Оценка коэффициента Жаккара по доле совпавших хешей"""
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / NUM_PERM
+
+
+# Функция для добавления или обновления референса в индексе
+def index_reference(video_id, title=None, transcript=None, synopsis_orig=None, synopsis_red=None):
+    """Пустые аргументы не затирают уже сохраненные значения"""
+    conn = _connect()
+    existing = conn.execute(
+        "SELECT transcript FROM refs WHERE video_id = ?", (video_id,)
+    ).fetchone()
+
+    signature = None
+    if transcript and (existing is None or existing["transcript"] != transcript):
+        signature = minhash(transcript)
+
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO refs (video_id, title, transcript, synopsis_orig, synopsis_red, minhash, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(video_id) DO UPDATE SET
+                title = COALESCE(excluded.title, refs.title),
+                transcript = COALESCE(excluded.transcript, refs.transcript),
+                synopsis_orig = COALESCE(excluded.synopsis_orig, refs.synopsis_orig),
+                synopsis_red = COALESCE(excluded.synopsis_red, refs.synopsis_red),
+                minhash = COALESCE(excluded.minhash, refs.minhash),
+                updated_at = excluded.updated_at
+            """,
+            (
+                video_id,
+                title or None,
+                transcript or None,
+                synopsis_orig or None,
+                synopsis_red or None,
+                _pack(signature) if signature else None,
+                time.time(),
+            )
+        )
+        if signature:
+            conn.execute("DELETE FROM lsh WHERE video_id = ?", (video_id,))
+            conn.executemany(
+                "INSERT INTO lsh (band, bucket, video_id) VALUES (?, ?, ?)",
+                [(band, bucket, video_id) for band, bucket in _buckets(signature)]
+            )
+
+
+# Функция для поиска почти-дубликатов транскрипции
+def find_similar(transcript, threshold=0.9, limit=5, with_synopsis=False):
+    """Возвращает список референсов с похожестью >= threshold (от большей к меньшей).
+
+    with_synopsis=True - только референсы с готовым синопсисом (отбор до limit).
+    """
+    signature = minhash(transcript)
+    if not signature:
+        return []
+    conn = _connect()
+    buckets = _buckets(signature)
+    placeholders = " OR ".join(["(band = ? AND bucket = ?)"] * len(buckets))
+    params = [value for pair in buckets for value in pair]
+    candidates = conn.execute(
+        f"""
+        SELECT video_id, title, synopsis_orig, synopsis_red, minhash FROM refs
+        WHERE video_id IN (SELECT DISTINCT video_id FROM lsh WHERE {placeholders})
+        {"AND synopsis_orig IS NOT NULL" if with_synopsis else ""}
+        """,
+        params
+    ).fetchall()
+
+    results = []
+    for row in candidates:
+        score = similarity(signature, _unpack(row["minhash"]))
+        if score >= threshold:
+            results.append({
+                "video_id": row["video_id"],
+                "title": row["title"] or "",
+                "similarity": score,
+                "synopsis_orig": row["synopsis_orig"] or "",
+                "synopsis_red": row["synopsis_red"] or "",
+            })
+    results.sort(key=lambda r: r["similarity"], reverse=True)
+    return results[:limit]
+
+
+# Функция для полнотекстового поиска по референсам
+def search(query, limit=20):
+    # Каждое слово берем в кавычки, чтобы символы запроса не ломали синтаксис FTS5
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return []
+    match = " ".join('"' + term + '"' for term in terms)
+    rows = _connect().execute(
+        """
+        SELECT refs.video_id, refs.title,
+               snippet(refs_fts, -1, '[', ']', '…', 16) AS snippet,
+               refs.synopsis_orig IS NOT NULL AS has_synopsis
+        FROM refs_fts JOIN refs ON refs.rowid = refs_fts.rowid
+        WHERE refs_fts MATCH ?
+        ORDER BY bm25(refs_fts)
+        LIMIT ?
+        """,
+        (match, limit)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+# Функция для индексации всех видео из хранилища (store.py), которых еще нет в индексе
+def index_store():
+    import store
+
+    conn = _connect()
+    indexed = 0
+    for video_id in store.iter_video_ids():
+        if conn.execute("SELECT 1 FROM refs WHERE video_id = ? AND transcript IS NOT NULL", (video_id,)).fetchone():
+            continue
+        meta = store.load_meta(video_id)
+        if not meta or meta.get("status") != "ok":
+            continue
+        transcript = "\n".join(segment["text"] for segment in store.iter_segments(video_id))
+        index_reference(video_id, title=meta.get("title"), transcript=transcript)
+        indexed += 1
+    return indexed
+
+
+def count():
+    return _connect().execute("SELECT COUNT(*) FROM refs").fetchone()[0]
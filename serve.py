@@ -0,0 +1,86 @@
+"""Запуск приложения на VPS: прогрев, проверка готовности и Streamlit в одном процессе.
+
+Использование (вместо `streamlit run app.py`):
+    python serve.py [аргументы streamlit, например --server.port 8501]
+
+Переменные окружения:
+    READY_PORT - порт эндпоинта /ready (по умолчанию 8502, 0 - отключить)
+
+/ready и READY=1 для systemd сообщаются после прогрева и только когда порт Streamlit
+(--server.port или STREAMLIT_SERVER_PORT, по умолчанию 8501) уже принимает соединения.
+"""
+import os
+import sys
+import socket
+import threading
+
+import resources
+
+
+# Функция для получения значения параметра streamlit из аргументов (--name value или --name=value)
+def get_streamlit_option(args, name, env_name, default):
+    for i, arg in enumerate(args):
+        if arg == name and i + 1 < len(args):
+            return args[i + 1]
+        if arg.startswith(name + "="):
+            return arg[len(name) + 1:]
+    return os.environ.get(env_name, default)
+
+
+# Функция-условие готовности: порт Streamlit уже принимает соединения
+def streamlit_port_check(host, port):
+    accepting = threading.Event()
+
+    def check():
+        if not accepting.is_set():
+            try:
+                with socket.create_connection((host, port), timeout=1):
+                    accepting.set()  # Порт не закрывается до остановки процесса
+            except OSError:
+                pass
+        return accepting.is_set()
+
+    return check
+
+
+# Функция для уведомления systemd (Type=notify) о готовности после прогрева
+def notify_systemd_when_ready():
+    notify_socket = os.environ.get("NOTIFY_SOCKET")
+    if not notify_socket:
+        return
+
+    def _notify():
+        resources.wait_until_ready()
+        address = notify_socket
+        if address.startswith("@"):
+            address = "\0" + address[1:]
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(b"READY=1")
+
+    threading.Thread(target=_notify, name="sd-notify", daemon=True).start()
+
+
+def main():
+    os.chdir(resources.APP_DIR)
+    resources.start_warmup()
+
+    args = sys.argv[1:]
+    port = int(get_streamlit_option(args, "--server.port", "STREAMLIT_SERVER_PORT", "8501"))
+    host = get_streamlit_option(args, "--server.address", "STREAMLIT_SERVER_ADDRESS", "")
+    if host in ("", "0.0.0.0", "::"):
+        host = "127.0.0.1"
+    resources.add_ready_check(streamlit_port_check(host, port))
+
+    ready_port = int(os.environ.get("READY_PORT", "8502"))
+    if ready_port:
+        resources.start_readiness_server(ready_port)
+    notify_systemd_when_ready()
+
+    from streamlit.web import cli as stcli
+    sys.argv = ["streamlit", "run", "app.py", *args]
+    sys.exit(stcli.main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Хранилище обработанных видео на диске.
+
+Каждое видео - отдельный файл data/videos/<video_id>.jsonl: первая строка -
+метаданные, далее по строке на сегмент транскрипции {start, duration, text}.
+Файл пишется во временный и атомарно переименовывается, поэтому незавершенных
+записей не бывает, а наличие файла означает, что видео уже обработано.
+Сегменты читаются построчно и не загружаются в память целиком.
+"""
+import os
+import json
+import time
+import tempfile
+
+import resources
+
+VIDEOS_DIR = os.path.join(resources.DATA_DIR, "videos")
+
+# Статусы, при которых видео не нужно обрабатывать повторно
+DONE_STATUSES = ("ok", "unavailable")
+
+
+def video_path(video_id):
+    return os.path.join(VIDEOS_DIR, f"{video_id}.jsonl")
+
+
+# Функция для сохранения видео: метаданные и сегменты транскрипции
+def save_video(meta, segments=()):
+    os.makedirs(VIDEOS_DIR, exist_ok=True)
+    meta = dict(meta)
+    meta.setdefault("status", "ok")
+    meta["saved_at"] = time.time()
+    path = video_path(meta["video_id"])
+    # Уникальный временный файл: одно видео могут сохранять несколько потоков или процессов сразу
+    fd, tmp_path = tempfile.mkstemp(dir=VIDEOS_DIR, prefix=f"{meta['video_id']}.", suffix=".tmp")
+    count = 0
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(json.dumps(meta, ensure_ascii=False) + "\n")
+            for segment in segments:
+                file.write(json.dumps(segment, ensure_ascii=False) + "\n")
+                count += 1
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return count
+
+
+# Функция для чтения метаданных видео (первая строка файла)
+def load_meta(video_id):
+    try:
+        with open(video_path(video_id), "r", encoding="utf-8") as file:
+            return json.loads(file.readline())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def is_done(video_id):
+    meta = load_meta(video_id)
+    return meta is not None and meta.get("status") in DONE_STATUSES
+
+
+# Генератор записей видео за один проход по файлу: сначала метаданные, затем сегменты
+def iter_video(video_id):
+    with open(video_path(video_id), "r", encoding="utf-8") as file:
+        yield json.loads(file.readline())
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+# Генератор сегментов транскрипции видео
+def iter_segments(video_id):
+    records = iter_video(video_id)
+    next(records)  # Метаданные
+    yield from records
+
+
+# Генератор ID сохраненных видео (без чтения содержимого)
+def iter_video_ids():
+    if not os.path.isdir(VIDEOS_DIR):
+        return
+    with os.scandir(VIDEOS_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith(".jsonl"):
+                yield entry.name[:-len(".jsonl")]
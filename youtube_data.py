@@ -0,0 +1,175 @@
+"""Получение данных с YouTube: запросы к API с ротацией ключей, транскрипции и прокси.
+
+Функции модуля не обращаются к Streamlit и используются как страницей
+одного видео, так и массовой загрузкой каналов и плейлистов.
+"""
+import os
+import json
+import random
+import threading
+
+import resources
+from deadline import Deadline, DeadlineExceeded
+
+PROXY_CONFIG_PATH = os.path.join(resources.APP_DIR, "proxy_config.json")
+
+# Языки транскрипции в порядке предпочтения; если ни одного нет - берем первую доступную
+PREFERRED_LANGUAGES = ['en', 'es', 'ru', 'fr', 'de', 'pt', 'it', 'ja', 'ko', 'zh']
+
+# Ошибки, означающие, что транскрипции у видео нет (смена прокси не поможет)
+NO_TRANSCRIPT_ERRORS = (
+    "TranscriptsDisabled",
+    "NoTranscriptFound",
+    "NoTranscriptAvailable",
+    "VideoUnavailable",
+    "VideoUnplayable",
+    "InvalidVideoId",
+    "AgeRestricted",
+)
+
+
+class QuotaExceeded(Exception):
+    """Все ключи YouTube API исчерпали квоту"""
+
+
+# Функция для выполнения запроса к YouTube API с перебором ключей при исчерпании квоты
+def execute_with_keys(make_request, deadline=None):
+    """make_request(youtube) должна вернуть объект запроса googleapiclient"""
+    from googleapiclient.errors import HttpError
+
+    api_keys = resources.get_youtube_api_keys()
+    if not api_keys:
+        raise QuotaExceeded("Не найдены ключи YOUTUBE_API_KEY_1..N")
+
+    for api_key in api_keys:
+        request = make_request(resources.get_youtube_client(api_key))
+        try:
+            return resources.execute_youtube(request, deadline)
+        except HttpError as e:
+            if "quota" in str(e).lower():
+                continue  # Пробуем следующий ключ, если превышена квота
+            raise
+    raise QuotaExceeded("Все API ключи исчерпали квоту")
+
+
+class ProxyPool:
+    """Ротация прокси из proxy_config.json (формат host:port:username:password)"""
+
+    def __init__(self, proxies, max_retries_per_proxy=2):
+        self.proxies = list(proxies)
+        random.shuffle(self.proxies)
+        self.max_retries_per_proxy = max_retries_per_proxy
+        self._index = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path=PROXY_CONFIG_PATH):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                config = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return cls([])
+        return cls(config.get("proxies", []), config.get("max_retries_per_proxy", 2))
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def next(self):
+        """Возвращает URL следующего прокси или None, если прокси не настроены"""
+        if not self.proxies:
+            return None
+        with self._lock:
+            entry = self.proxies[self._index % len(self.proxies)]
+            self._index += 1
+        host, port, username, password = entry.split(":", 3)
+        return f"http://{username}:{password}@{host}:{port}"
+
+
+_proxy_pool = None
+
+
+def get_proxy_pool():
+    global _proxy_pool
+    if _proxy_pool is None:
+        _proxy_pool = ProxyPool.from_config()
+    return _proxy_pool
+
+
+# Функция для получения сегментов транскрипции видео
+def fetch_transcript_segments(video_id, deadline=None, proxy=None):
+    """Возвращает список {start, duration, text} или None, если транскрипции нет.
+
+    Сетевые ошибки и блокировки пробрасываются - их можно повторить через другой прокси.
+    """
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    # Отдельная сессия на общем пуле соединений: прокси задаются только для нее
+    kwargs = {"http_client": resources.get_http_session(deadline or Deadline(resources.HTTP_TIMEOUT * 4))}
+    if proxy:
+        from youtube_transcript_api.proxies import GenericProxyConfig
+        kwargs["proxy_config"] = GenericProxyConfig(http_url=proxy, https_url=proxy)
+    api = YouTubeTranscriptApi(**kwargs)
+
+    try:
+        # Один запрос списка вместо перебора языков по одному
+        transcript_list = api.list(video_id)
+        try:
+            transcript = transcript_list.find_transcript(PREFERRED_LANGUAGES)
+        except Exception:
+            transcript = next(iter(transcript_list))
+        transcript_data = transcript.fetch()
+    except DeadlineExceeded:
+        raise
+    except StopIteration:
+        return None
+    except Exception as e:
+        if type(e).__name__ in NO_TRANSCRIPT_ERRORS:
+            return None
+        raise
+
+    # Каждый элемент FetchedTranscript имеет атрибуты: text, start, duration
+    return [
+        {"start": entry.start, "duration": entry.duration, "text": str(entry.text)}
+        for entry in transcript_data
+    ]
+
+
+# Функция для получения транскрипции с ротацией прокси
+def fetch_transcript_with_rotation(video_id, deadline=None, proxy_pool=None, max_proxies=3):
+    """Перебирает до max_proxies прокси (каждый - max_retries_per_proxy раз), затем пробует напрямую"""
+    attempts = []
+    if proxy_pool is not None and len(proxy_pool):
+        for _ in range(min(max_proxies, len(proxy_pool))):
+            proxy = proxy_pool.next()
+            attempts.extend([proxy] * proxy_pool.max_retries_per_proxy)
+    attempts.append(None)
+
+    last_error = None
+    for proxy in attempts:
+        try:
+            return fetch_transcript_segments(video_id, deadline, proxy=proxy)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            last_error = e
+    raise last_error
+
+
+# Функция для форматирования времени в MM:SS или HH:MM:SS
+def format_time(seconds):
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    if hours > 0:
+        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+    else:
+        return f"{minutes:02d}:{secs:02d}"
+
+
+# Функция для сборки текста транскрипции в двух форматах: без меток и с метками времени
+def format_transcript(segments):
+    full_text = '\n'.join(segment["text"] for segment in segments)
+    full_text_with_timestamps = '\n'.join(
+        f"[{format_time(segment['start'])}] {segment['text']}" for segment in segments
+    )
+    return full_text, full_text_with_timestamps